@@ -0,0 +1,557 @@
+"""
+Benchmarks for the v3 interpreter; entry point is `python3 benchmark.py [--baseline revision] [benchmark ...]`.
+With no benchmarks named every benchmark is run. Benchmark programs live in v3/bench/.
+
+With --baseline, the benchmarks are first run with the interpreter of another git revision (checked out into a
+temporary worktree), on the same benchmark programs, and then with the working tree's, for a before and after.
+Modules and names that only some benchmarks use are imported by those benchmarks, so that the others can still be
+run against revisions that don't have them.
+"""
+
+import gc
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from bparser import BParser
+from interpreterv3 import Interpreter
+
+BENCH_DIRECTORY = "v3/bench/"
+REPEATS = 3
+
+
+def load_program(name):
+    """Read a benchmark program from v3/bench/ as a list of lines."""
+    with open(f"{BENCH_DIRECTORY}{name}.brewin", encoding="utf-8") as handle:
+        return handle.readlines()
+
+
+def time_program(program, repeats=REPEATS, **interpreter_args):
+    """Run a program several times; returns the best wall-clock time and the program's output."""
+    best = None
+    for _ in range(repeats):
+        interpreter = Interpreter(False, None, False, **interpreter_args)
+        start = time.perf_counter()
+        interpreter.run(program)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, interpreter.get_output()
+
+
+def bench_engines():
+    """every benchmark program under each execution engine, relative to the v3_ast tree-walker"""
+    engines = Interpreter.ENGINES
+    print(f"{'program':<14}{'engine':<10}{'time':>10}{'speedup':>10}")
+    names = sorted(name[: -len(".brewin")] for name in os.listdir(BENCH_DIRECTORY) if name.endswith(".brewin"))
+    for name in names:
+        program = load_program(name)
+        baseline_time = baseline_output = None
+        for engine in engines:
+            elapsed, output = time_program(program, engine=engine)
+            if baseline_time is None:
+                baseline_time, baseline_output = elapsed, output
+            elif output != baseline_output:
+                raise RuntimeError(f"{name}: {engine} engine printed {output}, expected {baseline_output}")
+            print(f"{name:<14}{engine:<10}{elapsed:>9.3f}s{baseline_time / elapsed:>9.2f}x")
+
+
+def bench_constants():
+    """a tight loop whose expressions are mostly literals and constant subexpressions"""
+    program = load_program("constants")
+    print(f"{'engine':<10}{'time':>10}")
+    for engine in Interpreter.ENGINES:
+        elapsed, _ = time_program(program, engine=engine)
+        print(f"{engine:<10}{elapsed:>9.3f}s")
+
+
+def bench_locals():
+    """nested let blocks in loops and method calls, which read and write parameters and locals"""
+    program = load_program("locals")
+    print(f"{'engine':<10}{'time':>10}")
+    for engine in Interpreter.ENGINES:
+        elapsed, _ = time_program(program, engine=engine)
+        print(f"{engine:<10}{elapsed:>9.3f}s")
+
+
+def bench_recursion():
+    """recursive calls: fib, and Ackermann's function and a binary tree walk"""
+    print(f"{'program':<14}{'engine':<10}{'time':>10}{'calls/s':>12}")
+    for name in ["fib", "recursion"]:
+        program = load_program(name)
+        interpreter = Interpreter(False)
+        interpreter.run(program)
+        calls = interpreter.get_call_site_stats()
+        calls = calls["hits"] + calls["misses"]
+        for engine in Interpreter.ENGINES:
+            elapsed, _ = time_program(program, engine=engine)
+            print(f"{name:<14}{engine:<10}{elapsed:>9.3f}s{calls / elapsed:>12.0f}")
+
+
+def countdown_program(depth):
+    """A program whose main method recurses depth calls deep and prints depth."""
+    return f"""(class main
+      (method int down ((int n))
+        (if (== n 0) (return 0) (return (+ 1 (call me down (- n 1)))))
+      )
+      (method void main () (print (call me down {depth})))
+    )""".splitlines()
+
+
+def bench_deep_recursion():
+    """
+    Brewin recursion far deeper than Python's default recursion limit allows, under each engine. A little short of
+    100000 calls deep (five Python frames each, here), the ast and closure engines reach
+    Interpreter.MAX_PYTHON_RECURSION_LIMIT and report a FAULT_ERROR; the bytecode engine's call stack is bounded only
+    by recursion_limit.
+    """
+    print(f"{'depth':<10}{'engine':<10}{'time':>10}{'bytes/level':>14}")
+    for depth in [1000, 10000, 90000, 100000, 300000]:
+        program = countdown_program(depth)
+        limit = depth + 2  # main, and down from depth to 0
+        for engine in Interpreter.ENGINES:
+            try:
+                elapsed, output = time_program(program, 1, engine=engine, recursion_limit=limit)
+            except RuntimeError as error:
+                print(f"{depth:<10}{engine:<10}{'-':>10}{'-':>14}  {error}")
+                continue
+            if output != [str(depth)]:
+                raise RuntimeError(f"depth {depth}: {engine} engine printed {output}")
+            if engine != Interpreter.ENGINE_BYTECODE:
+                # tracemalloc walks the whole Python stack on every allocation, which takes hours this deep
+                print(f"{depth:<10}{engine:<10}{elapsed:>9.3f}s{'-':>14}")
+                continue
+            interpreter = Interpreter(False, engine=engine, recursion_limit=limit)
+            tracemalloc.start()
+            interpreter.run(program)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{depth:<10}{engine:<10}{elapsed:>9.3f}s{peak / depth:>14.0f}")
+
+
+def tail_call_program(depth):
+    """A program whose main method sums 1..depth with a tail-recursive method and prints the sum."""
+    return f"""(class main
+      (method int sum ((int n) (int acc))
+        (if (== n 0) (return acc) (return (call me sum (- n 1) (+ acc n))))
+      )
+      (method void main () (print (call me sum {depth} 0)))
+    )""".splitlines()
+
+
+def bench_tail_calls():
+    """tail-recursive loops, which run in constant stack space under every engine"""
+    print(f"{'depth':<10}{'engine':<10}{'time':>10}{'peak bytes':>12}")
+    for depth in [1000, 100000]:
+        program = tail_call_program(depth)
+        for engine in Interpreter.ENGINES:
+            elapsed, output = time_program(program, 1, engine=engine)
+            if output != [str(depth * (depth + 1) // 2)]:
+                raise RuntimeError(f"depth {depth}: {engine} engine printed {output}")
+            interpreter = Interpreter(False, engine=engine)
+            tracemalloc.start()
+            interpreter.run(program)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{depth:<10}{engine:<10}{elapsed:>9.3f}s{peak:>12}")
+
+
+def bench_parser():
+    """parsing throughput on a 2 MB program made of copies of the benchmark programs"""
+    from fuzz_bparser import reference_parse  # pylint: disable=import-outside-toplevel
+
+    source = ""
+    for name in sorted(os.listdir(BENCH_DIRECTORY)):
+        with open(f"{BENCH_DIRECTORY}{name}", encoding="utf-8") as handle:
+            source += handle.read()
+    source *= 2_000_000 // len(source) + 1
+    megabytes = len(source.encode("utf-8")) / 1e6
+    lines = source.splitlines(keepends=True)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "program.brewin")
+        with open(path, "w", encoding="utf-8") as handle:
+            handle.write(source)
+
+        def parse_file():
+            with open(path, encoding="utf-8") as program:
+                for _ in BParser.parse_stream(program):
+                    pass
+
+        def parse_without_gc():
+            # the parse makes no cycles, so a caller parsing a large program may turn the collector off around it
+            gc.disable()
+            try:
+                BParser.parse(lines)
+            finally:
+                gc.enable()
+
+        print(f"{'parser':<28}{'time':>10}{'MB/s':>8}")
+        for name, parse in [
+            ("reference_parse(lines)", lambda: reference_parse(lines)),
+            ("BParser.parse(lines)", lambda: BParser.parse(lines)),
+            ("  with gc disabled", parse_without_gc),
+            ("BParser.parse_stream(file)", parse_file),
+        ]:
+            best = None
+            for _ in range(REPEATS):
+                start = time.perf_counter()
+                parse()
+                elapsed = time.perf_counter() - start
+                if best is None or elapsed < best:
+                    best = elapsed
+            print(f"{name:<28}{best:>9.3f}s{megabytes / best:>8.2f}")
+
+
+def bench_tokens():
+    """memory held by the parse of a 100,000-line program, with one StringWithLineNumber per token and compacted"""
+    source = []
+    for name in sorted(os.listdir(BENCH_DIRECTORY)):
+        with open(f"{BENCH_DIRECTORY}{name}", encoding="utf-8") as handle:
+            source += handle.readlines()
+    lines = source * (100_000 // len(source) + 1)
+    print(f"{'tokens':<14}{'time':>10}{'memory':>12}")
+    for compact in [False, True]:
+        start = time.perf_counter()
+        BParser.parse(lines, compact)
+        elapsed = time.perf_counter() - start
+        tracemalloc.start()
+        parsed = BParser.parse(lines, compact)
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del parsed
+        kind = "compact" if compact else "per token"
+        print(f"{kind:<14}{elapsed:>9.3f}s{memory / 1e6:>10.1f}MB")
+
+
+def bench_program_cache():
+    """loading the v3 test programs 20 times each, without and with a ProgramCache (in memory, then from disk only)"""
+    from tester import test_files  # pylint: disable=import-outside-toplevel
+    from v3_cache import ProgramCache  # pylint: disable=import-outside-toplevel
+
+    programs = []
+    for name in test_files:
+        with open(f"v3/tests/{name}.brewin", encoding="utf-8") as handle:
+            programs.append(handle.readlines())
+    runs = 20
+    print(f"{'cache':<10}{'time':>10}{'per load':>12}  stats")
+    with tempfile.TemporaryDirectory() as directory:
+        for kind in ["none", "memory", "disk"]:
+            cache = None if kind == "none" else ProgramCache(directory=directory)
+            start = time.perf_counter()
+            for _ in range(runs):
+                if kind == "disk":
+                    # a new cache each time keeps nothing in memory, so every program comes from the disk
+                    cache = ProgramCache(directory=directory)
+                for program in programs:
+                    interpreter = Interpreter(False, program_cache=cache)
+                    try:
+                        interpreter.load(program)
+                    except RuntimeError:
+                        pass  # a few of the programs have errors in their class definitions
+            elapsed = time.perf_counter() - start
+            stats = "" if cache is None else cache.get_stats()
+            print(f"{kind:<10}{elapsed:>9.3f}s{elapsed / (runs * len(programs)) * 1e6:>10.0f}us  {stats}")
+
+
+def bench_call_sites():
+    """call site cache hit rates for the call-heavy programs"""
+    print(f"{'program':<14}{'sites':>8}{'hits':>10}{'misses':>10}")
+    for name in ["fib", "linked_list"]:
+        interpreter = Interpreter(False)
+        interpreter.run(load_program(name))
+        stats = interpreter.get_call_site_stats()
+        print(f"{name:<14}{stats['call_sites']:>8}{stats['hits']:>10}{stats['misses']:>10}")
+
+
+def bench_arithmetic():
+    """int and bool operator throughput on arithmetic-heavy programs, in operators evaluated per second"""
+    print(f"{'program':<14}{'engine':<10}{'time':>10}{'ops/s':>12}")
+    # operators each program evaluates (arithmetic.brewin also adds 1 on about half its iterations, not counted)
+    for name, operators in [("arithmetic", 30000 * 13 + 1), ("loop", 300 * 300 * 5 + 300 * 3 + 1)]:
+        program = load_program(name)
+        for engine in Interpreter.ENGINES:
+            elapsed, _ = time_program(program, engine=engine)
+            print(f"{name:<14}{engine:<10}{elapsed:>9.3f}s{operators / elapsed:>12.0f}")
+
+
+def bench_unboxed():
+    """
+    Operator-heavy programs under each engine with pure expressions evaluated unboxed, as they are, and with every
+    operator evaluated boxed instead (compile_unboxed() in v3_ast.py never specializing an expression).
+    """
+    import v3_ast  # pylint: disable=import-outside-toplevel
+    import v3_bytecode  # pylint: disable=import-outside-toplevel
+    import v3_closure  # pylint: disable=import-outside-toplevel
+
+    modules = [v3_ast, v3_closure, v3_bytecode]
+    compile_unboxed = v3_ast.compile_unboxed
+    print(f"{'program':<14}{'engine':<10}{'unboxed':>10}{'boxed':>10}{'speedup':>10}")
+    for name in ["arithmetic", "loop", "constants"]:
+        program = load_program(name)
+        for engine in Interpreter.ENGINES:
+            unboxed_time, unboxed_output = time_program(program, engine=engine)
+            for module in modules:
+                module.compile_unboxed = lambda node: False
+            try:
+                boxed_time, boxed_output = time_program(program, engine=engine)
+            finally:
+                for module in modules:
+                    module.compile_unboxed = compile_unboxed
+            if boxed_output != unboxed_output:
+                raise RuntimeError(f"{name}: {engine} engine printed {boxed_output} boxed, {unboxed_output} unboxed")
+            print(f"{name:<14}{engine:<10}{unboxed_time:>9.3f}s{boxed_time:>9.3f}s{boxed_time / unboxed_time:>9.2f}x")
+
+
+def bench_construction():
+    """object construction throughput; each object in construct.brewin has two superclass parts"""
+    program = load_program("construct")
+    objects = 3 * int(time_program(program, 1)[1][0])
+    print(f"{'engine':<10}{'time':>10}{'objects/s':>12}")
+    for engine in Interpreter.ENGINES:
+        elapsed, _ = time_program(program, engine=engine)
+        print(f"{engine:<10}{elapsed:>9.3f}s{objects / elapsed:>12.0f}")
+    print(f"memory: {measure_object_size(program, 'shape3'):.0f} bytes per (new shape3)")
+
+
+def bench_new():
+    """(new ...) throughput on a loop that allocates plain and template class objects"""
+    program = load_program("allocate")
+    objects = 6 * int(time_program(program, 1)[1][0])
+    print(f"{'engine':<10}{'time':>10}{'objects/s':>12}")
+    for engine in Interpreter.ENGINES:
+        elapsed, _ = time_program(program, engine=engine)
+        print(f"{engine:<10}{elapsed:>9.3f}s{objects / elapsed:>12.0f}")
+    bench_new_expression(program)
+
+
+def bench_new_expression(program, count=100000):
+    """
+    The cost of one (new ...) expression of the tree-walker, for each class allocate.brewin allocates: looking the
+    class up by name each time, as instantiate() does (and NewNode did), against NewNode's class resolved once.
+    """
+    from v3_ast import NewNode  # pylint: disable=import-outside-toplevel
+    from v3_type_value import Value  # pylint: disable=import-outside-toplevel
+
+    interpreter = Interpreter(False)
+    interpreter.run(program)
+    main_object = interpreter.main_object
+    print(f"{'class':<10}{'by name':>12}{'resolved':>12}")
+    for class_name in ["point", "box@int"]:
+        node = NewNode(None, class_name)
+        best = {}
+        for _ in range(REPEATS):
+            for path, evaluate in [
+                ("by name", lambda: Value(node.class_type, interpreter.instantiate(node.class_name, node.line_num))),
+                ("resolved", lambda: node.evaluate(main_object, None)),
+            ]:
+                start = time.perf_counter()
+                for _ in range(count):
+                    evaluate()
+                elapsed = (time.perf_counter() - start) / count
+                best[path] = min(best.get(path, elapsed), elapsed)
+        print(f"{class_name:<10}{best['by name'] * 1e9:>10.0f}ns{best['resolved'] * 1e9:>10.0f}ns")
+
+
+def measure_object_size(program, class_name, count=10000):
+    """Average number of bytes allocated per instance of class_name, measured with tracemalloc."""
+    interpreter = Interpreter(False)
+    interpreter.load(program)
+    interpreter.instantiate(class_name, None)  # warm up any lazily created state
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [interpreter.instantiate(class_name, None) for _ in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objects
+    return (after - before) / count
+
+
+def inheritance_chain_program(depth, calls):
+    """A program whose main object is depth classes below the base class, and calls a base class method calls times."""
+    classes = ["(class c0 (field int n 0) (method void bump () (set n (+ n 1))) (method int get () (return n)))"]
+    for level in range(1, depth + 1):
+        classes.append(f"(class c{level} inherits c{level - 1} (method void noop () (return)))")
+    classes.append(
+        f"""(class main
+          (method void main ()
+            (let ((c{depth} obj null) (int i 0))
+              (set obj (new c{depth}))
+              (while (< i {calls}) (begin (call obj bump) (set i (+ i 1))))
+              (print (call obj get))
+            )
+          )
+        )"""
+    )
+    return "\n".join(classes).splitlines()
+
+
+def bench_inheritance_depth():
+    """calls to a base class method through inheritance chains of increasing depth"""
+    print(f"{'depth':<10}{'time':>10}")
+    for depth in [1, 10, 50]:
+        elapsed, _ = time_program(inheritance_chain_program(depth, 5000))
+        print(f"{depth:<10}{elapsed:>9.3f}s")
+
+
+def bench_values():
+    """memory taken by Values: bytes per Value, and peak traced memory of the allocation-heavy linked_list.brewin"""
+    from v3_type_value import NOTHING_TYPE, Value  # pylint: disable=import-outside-toplevel
+
+    count = 10000
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    values = [Value(NOTHING_TYPE, None) for _ in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del values
+    print(f"{(after - before) / count:.0f} bytes per Value (with its list slot)")
+    program = load_program("linked_list")
+    print(f"{'engine':<10}{'time':>10}{'peak bytes':>12}")
+    for engine in Interpreter.ENGINES:
+        elapsed, _ = time_program(program, engine=engine)
+        interpreter = Interpreter(False, engine=engine)
+        tracemalloc.start()
+        interpreter.run(program)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{engine:<10}{elapsed:>9.3f}s{peak:>12}")
+
+
+def specialization_program(k):
+    """A program with its own template class and class, which it specializes and instantiates."""
+    return f"""(tclass box{k} (t) (field t contents))
+    (class item{k} (field int n 0))
+    (class main
+      (method void main ()
+        (let ((box{k}@item{k} b null))
+          (set b (new box{k}@item{k}))
+          (print (== b null))
+        )
+      )
+    )""".splitlines()
+
+
+def bench_interned_types():
+    """interned Types left behind by programs that are gone, each with types of its own"""
+    from v3_type_value import TypeManager  # pylint: disable=import-outside-toplevel
+
+    print(f"{'programs':<10}{'time':>10}{'types before':>14}{'types after':>13}")
+    for count in [100, 1000]:
+        gc.collect()
+        before = len(TypeManager.interned_types)
+        start = time.perf_counter()
+        for k in range(count):
+            Interpreter(False).run(specialization_program(k))
+        elapsed = time.perf_counter() - start
+        gc.collect()
+        print(f"{count:<10}{elapsed:>9.3f}s{before:>14}{len(TypeManager.interned_types):>13}")
+
+
+def bench_type_checks():
+    """assignments, parameter passing and comparisons across a 50-deep class hierarchy"""
+    depth = 50
+    classes = ["(class c0 (method bool same ((c0 other) (c0 me_too)) (return (== other me_too))))"]
+    for level in range(1, depth + 1):
+        classes.append(f"(class c{level} inherits c{level - 1})")
+    classes.append(
+        f"""(class main
+          (method void main ()
+            (let ((c0 base null) (c{depth} leaf null) (int i 0) (int same 0))
+              (set leaf (new c{depth}))
+              (while (< i 5000)
+                (begin
+                  (set base leaf)
+                  (if (call leaf same base leaf) (set same (+ same 1)))
+                  (set i (+ i 1))
+                )
+              )
+              (print same)
+            )
+          )
+        )"""
+    )
+    program = "\n".join(classes).splitlines()
+    elapsed, output = time_program(program)
+    print(f"program: {elapsed:.3f}s (printed {output[0]})")
+
+    interpreter = Interpreter(False)
+    interpreter.load(program)
+    type_manager = interpreter.type_manager
+    base_type, leaf_type = type_manager.get_type_info("c0"), type_manager.get_type_info(f"c{depth}")
+    checks = 100000
+    start = time.perf_counter()
+    for _ in range(checks):
+        type_manager.check_type_compatibility(base_type, leaf_type, True)
+        type_manager.check_type_compatibility(leaf_type, base_type, True)
+    elapsed = time.perf_counter() - start
+    print(f"check_type_compatibility: {elapsed / (2 * checks) * 1e9:.0f}ns per check")
+
+
+BENCHMARKS = {
+    "engines": bench_engines,
+    "arithmetic": bench_arithmetic,
+    "unboxed": bench_unboxed,
+    "construction": bench_construction,
+    "new": bench_new,
+    "inheritance": bench_inheritance_depth,
+    "constants": bench_constants,
+    "locals": bench_locals,
+    "recursion": bench_recursion,
+    "deep_recursion": bench_deep_recursion,
+    "tail_calls": bench_tail_calls,
+    "call_sites": bench_call_sites,
+    "parser": bench_parser,
+    "tokens": bench_tokens,
+    "program_cache": bench_program_cache,
+    "type_checks": bench_type_checks,
+    "interned_types": bench_interned_types,
+    "values": bench_values,
+}
+
+
+# run as `python -c BASELINE_SCRIPT benchmark.py tree benchmark ...`: runs benchmark.py with the interpreter modules
+# of tree in place of the working tree's (whose directory is otherwise first on the path); the benchmark programs are
+# still read from the working tree
+BASELINE_SCRIPT = (
+    "import runpy, sys; sys.path[0] = sys.argv.pop(2); sys.argv.pop(0); runpy.run_path(sys.argv[0], run_name='__main__')"
+)
+
+
+def run_baseline(revision, names):
+    """Runs the named benchmarks with the interpreter of another git revision, checked out into a temporary worktree."""
+    with tempfile.TemporaryDirectory() as directory:
+        tree = os.path.join(directory, "baseline")
+        subprocess.run(["git", "worktree", "add", "--quiet", "--detach", tree, revision], check=True)
+        try:
+            command = [sys.executable, "-c", BASELINE_SCRIPT, os.path.abspath(__file__), tree, *names]
+            if subprocess.run(command, check=False).returncode != 0:
+                print(f"(the benchmarks failed with the interpreter at {revision})")
+        finally:
+            subprocess.run(["git", "worktree", "remove", "--force", tree], check=True)
+
+
+def main():
+    """main entrypoint: runs the benchmarks named on the command line, or all of them"""
+    sys.setrecursionlimit(10000)
+    names = sys.argv[1:]
+    baseline = None
+    if names[:1] == ["--baseline"]:
+        baseline, names = names[1], names[2:]
+    names = names or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            raise ValueError(f"Unknown benchmark {name}; expect one of {', '.join(BENCHMARKS)}")
+    if baseline is not None:
+        print(f"#### interpreter at {baseline}")
+        run_baseline(baseline, names)
+        print("#### interpreter in the working tree")
+    for name in names:
+        print(f"== {name}: {BENCHMARKS[name].__doc__}")
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,14 @@
 # pylint: disable=too-few-public-methods
 
 """
-Provided module for parsing Brewin programs. When grading your project,
-we'll use our own copy; don't submit (or change) your own version!
+Provided module for parsing Brewin programs. This copy adds parse_stream,
+compact parsing and a faster tokenizer; its output must stay identical to the
+original's (fuzz_bparser.py checks this), since grading uses the original.
 """
 
+import re
+import sys
+
 
 class StringWithLineNumber(str):
     """
@@ -25,6 +29,23 @@ class StringWithLineNumber(str):
         return StringWithLineNumber(self, self.line_num)
 
 
+class ListWithLineNumber(list):
+    """
+    list of the parser output, tagged with the line number of its first token (line_num).
+    For a list that starts with a nested list, that's the line number of the nested list;
+    for an empty list, or one that starts with an empty list, it's None.
+    """
+
+    __slots__ = ("line_num",)
+
+
+class BParserError(Exception):
+    """
+    Raised by BParser.parse_stream when the input isn't well formed; the message is
+    the one BParser.parse reports.
+    """
+
+
 class BParser:
     """
     Static class that wraps BParser.parse and class-level constants. Do not initialize this class!
@@ -37,8 +58,13 @@ class BParser:
     WHITESPACE_CHARS = " \t\r\n"
     DELIMETER_CHARS = WHITESPACE_CHARS + OPEN_PAREN_CHAR + CLOSE_PAREN_CHAR
 
+    # matches each token of a line in turn, skipping whitespace: an unquoted token, which runs to the next
+    # delimiter, quote or comment character; a string, which runs to the next quote on the line (an unclosed one
+    # runs to the end of the line); a parenthesis; or the comment character
+    __TOKEN = re.compile(r'[^ \t\r\n()"#]+|"[^"]*"?|[()#]')
+
     @staticmethod
-    def parse(lines):
+    def parse(lines, compact=False):
         """
         Maps a list of input strings containing only alphanumeric tokens, spaces, and parentheses
         to a tuple with two items:
@@ -59,67 +85,75 @@ class BParser:
                 [(1, 'this'), (1, 'is'), (1, 'too')]
             ]
         )
-        """
-        cur_token = ""
-        in_quote = False
-        output = []
-        output_stack = [output]
-        for line_no, line in enumerate(lines):
-            line = BParser.__remove_comment(line)
-            for char in line:
-                if char == BParser.QUOTE_CHAR:
-                    if not in_quote:
-                        if cur_token:
-                            token_and_line_num = StringWithLineNumber(
-                                cur_token, line_no
-                            )
-                            output_stack[-1].append(token_and_line_num)
-                        cur_token = BParser.QUOTE_CHAR
-                        in_quote = True
-                    else:
-                        cur_token += BParser.QUOTE_CHAR
-                        token_and_line_num = StringWithLineNumber(cur_token, line_no)
-                        output_stack[-1].append(token_and_line_num)
-                        cur_token = ""
-                        in_quote = False
-                    continue
-                if in_quote:
-                    cur_token += char
-                    continue
 
-                if char in BParser.DELIMETER_CHARS:
-                    if cur_token:
-                        token_and_line_num = StringWithLineNumber(cur_token, line_no)
-                        output_stack[-1].append(token_and_line_num)
-                        cur_token = ""
-                if char == BParser.OPEN_PAREN_CHAR:
-                    nested = output_stack[-1]
-                    nested.append([])
-                    output_stack.append(nested[-1])
-                elif char == BParser.CLOSE_PAREN_CHAR:
-                    if len(output_stack) < 2:
-                        return False, "Extra closing parenthesis"
-                    output_stack.pop()
-                elif char not in BParser.WHITESPACE_CHARS:
-                    cur_token += char
-            if in_quote:
-                return False, "Unclosed string"
-            if cur_token:
-                token_and_line_num = StringWithLineNumber(cur_token, line_no)
-                output_stack[-1].append(token_and_line_num)
-                cur_token = ""
-        if len(output_stack) > 1:
-            return False, "Unclosed parenthesis"
-        return True, output
+        On failure the second item is the error message instead. lines can be anything
+        BParser.parse_stream accepts.
+
+        Each list is a ListWithLineNumber, and each token a StringWithLineNumber; with
+        compact=True tokens are interned plain strs instead, so every occurrence of a
+        name shares one object, and line numbers are only kept by the lists.
+        """
+        try:
+            return True, list(BParser.parse_stream(lines, compact))
+        except BParserError as error:
+            return False, str(error)
 
     @staticmethod
-    def __remove_comment(line):
-        in_string = False
-        stripped_line = ""
-        for char in line:
-            if char == BParser.COMMENT_CHAR and not in_string:
-                return stripped_line
-            if char == BParser.QUOTE_CHAR:
-                in_string = not in_string
-            stripped_line += char
-        return stripped_line
+    def parse_stream(source, compact=False):
+        """
+        Generator version of BParser.parse: yields each top-level item of the output of
+        BParser.parse (a nested list, or a token outside of any parentheses) as soon as
+        the line that completes it has been read, so a program never has to be held in
+        memory as text. source is any iterable of lines, such as a list of strings or an
+        open file, or a string holding the whole program. Raises BParserError with the
+        message BParser.parse would fail with; items yielded before that stay valid.
+        compact is as for BParser.parse.
+        """
+        if isinstance(source, str):
+            source = source.splitlines()
+        find_tokens = BParser.__TOKEN.findall
+        # makes a StringWithLineNumber without going through its __new__, which costs more than the rest of the loop
+        new_token = str.__new__
+        intern = sys.intern
+        open_lists = []  # the lists of the parentheses that are open, innermost last
+        for line_no, line in enumerate(source):
+            for token in find_tokens(line):
+                char = token[0]
+                if char == BParser.OPEN_PAREN_CHAR:
+                    nested = ListWithLineNumber()
+                    nested.line_num = None  # until its first token is read
+                    if open_lists:
+                        open_lists[-1].append(nested)
+                    open_lists.append(nested)
+                    continue
+                if char == BParser.CLOSE_PAREN_CHAR:
+                    if not open_lists:
+                        raise BParserError("Extra closing parenthesis")
+                    nested = open_lists.pop()
+                    if not open_lists:
+                        yield nested
+                    continue
+                if char == BParser.COMMENT_CHAR:
+                    break  # the rest of the line is a comment
+                if char == BParser.QUOTE_CHAR and (len(token) == 1 or token[-1] != BParser.QUOTE_CHAR):
+                    raise BParserError("Unclosed string")
+                if compact:
+                    token = intern(token)
+                else:
+                    token = new_token(StringWithLineNumber, token)
+                    token.line_num = line_no
+                if open_lists:
+                    nested = open_lists[-1]
+                    if not nested:
+                        # the first token of a list gives the line number of the list, and of each enclosing list
+                        # it's (the first item of the first item of ...) the first item of
+                        nested.line_num = line_no
+                        depth = len(open_lists) - 1
+                        while depth and len(open_lists[depth - 1]) == 1:
+                            depth -= 1
+                            open_lists[depth].line_num = line_no
+                    nested.append(token)
+                else:
+                    yield token
+        if open_lists:
+            raise BParserError("Unclosed parenthesis")
@@ -0,0 +1,185 @@
+"""
+Differential fuzz test for BParser; entry point is `python3 fuzz_bparser.py [iterations [seed]]`.
+Parses random inputs, and random mutations of the test programs in v1/, v2/ and v3/, with both
+BParser.parse and reference_parse (the original character-by-character parser), and fails if
+they disagree on any token, line number or error message, with compact=True or not.
+"""
+
+import glob
+import io
+import random
+import sys
+
+from bparser import BParser, BParserError, StringWithLineNumber
+
+ITERATIONS = 20000
+
+# pieces random lines are made of; every character the parser treats specially, plus characters it doesn't
+FRAGMENTS = ["(", ")", '"', "#", " ", "\t", "\r", "\n", "\f", "a", "b7", "-", "+", "@", "class", '"a b"', "é"]
+
+
+def reference_parse(lines):
+    """The original BParser.parse, character by character: the behavior the current one must keep."""
+    cur_token = ""
+    in_quote = False
+    output = []
+    output_stack = [output]
+    for line_no, line in enumerate(lines):
+        line = _reference_remove_comment(line)
+        for char in line:
+            if char == BParser.QUOTE_CHAR:
+                if not in_quote:
+                    if cur_token:
+                        output_stack[-1].append(StringWithLineNumber(cur_token, line_no))
+                    cur_token = BParser.QUOTE_CHAR
+                    in_quote = True
+                else:
+                    cur_token += BParser.QUOTE_CHAR
+                    output_stack[-1].append(StringWithLineNumber(cur_token, line_no))
+                    cur_token = ""
+                    in_quote = False
+                continue
+            if in_quote:
+                cur_token += char
+                continue
+
+            if char in BParser.DELIMETER_CHARS:
+                if cur_token:
+                    output_stack[-1].append(StringWithLineNumber(cur_token, line_no))
+                    cur_token = ""
+            if char == BParser.OPEN_PAREN_CHAR:
+                nested = output_stack[-1]
+                nested.append([])
+                output_stack.append(nested[-1])
+            elif char == BParser.CLOSE_PAREN_CHAR:
+                if len(output_stack) < 2:
+                    return False, "Extra closing parenthesis"
+                output_stack.pop()
+            elif char not in BParser.WHITESPACE_CHARS:
+                cur_token += char
+        if in_quote:
+            return False, "Unclosed string"
+        if cur_token:
+            output_stack[-1].append(StringWithLineNumber(cur_token, line_no))
+            cur_token = ""
+    if len(output_stack) > 1:
+        return False, "Unclosed parenthesis"
+    return True, output
+
+
+def _reference_remove_comment(line):
+    in_string = False
+    stripped_line = ""
+    for char in line:
+        if char == BParser.COMMENT_CHAR and not in_string:
+            return stripped_line
+        if char == BParser.QUOTE_CHAR:
+            in_string = not in_string
+        stripped_line += char
+    return stripped_line
+
+
+def comparable(parsed):
+    """The parser output with each token replaced by (text, line number), so == compares both."""
+    if isinstance(parsed, tuple):
+        return tuple(comparable(item) for item in parsed)
+    if isinstance(parsed, list):
+        return [comparable(item) for item in parsed]
+    if isinstance(parsed, StringWithLineNumber):
+        return (str(parsed), parsed.line_num)
+    return parsed
+
+
+def comparable_compact(parsed, reference=False):
+    """The parser output with each list replaced by (line number, items), for output parsed with compact=True; with
+    reference=True, for reference_parse output, each list's line number is found from its first token instead."""
+    if isinstance(parsed, tuple):
+        return tuple(comparable_compact(item, reference) for item in parsed)
+    if isinstance(parsed, list):
+        line_num = getattr(parsed, "line_num", None)
+        if reference:
+            first = parsed
+            while isinstance(first, list) and first:
+                first = first[0]
+            line_num = getattr(first, "line_num", None)
+        return (line_num, [comparable_compact(item, reference) for item in parsed])
+    if isinstance(parsed, str):
+        return str(parsed)
+    return parsed
+
+
+def random_lines(rng):
+    """A few lines of random fragments."""
+    return [
+        "".join(rng.choice(FRAGMENTS) for _ in range(rng.randrange(16)))
+        for _ in range(rng.randrange(1, 6))
+    ]
+
+
+def mutated_lines(rng, programs):
+    """One of programs with a few random fragments inserted and characters deleted."""
+    text = list(rng.choice(programs))
+    for _ in range(rng.randrange(4)):
+        position = rng.randrange(len(text) + 1)
+        if rng.random() < 0.5:
+            text.insert(position, rng.choice(FRAGMENTS))
+        else:
+            del text[position : position + rng.randrange(1, 4)]
+    return "".join(text).splitlines(keepends=rng.random() < 0.5)
+
+
+def check(lines):
+    """Returns a description of how the parsers disagree on lines, or None if they don't."""
+    reference = reference_parse(lines)
+    expected = comparable(reference)
+    actual = comparable(BParser.parse(lines))
+    if actual != expected:
+        return f"parse returned {actual}, expected {expected}"
+    expected_compact = comparable_compact(reference, True)
+    actual_compact = comparable_compact(BParser.parse(lines, compact=True))
+    if expected_compact[0]:
+        # the top-level list is a plain list, so its line number isn't compared
+        expected_compact = expected_compact[1][1]
+        actual_compact = actual_compact[1][1] if actual_compact[0] else actual_compact
+    if actual_compact != expected_compact:
+        return f"parse(compact=True) returned {actual_compact}, expected {expected_compact}"
+    # parse_stream must yield the same forms from a file (or from a generator, if the lines wouldn't read back from a
+    # file as they are), up to the error if there is one
+    if any("\n" in line for line in lines):
+        source = (line for line in lines)
+    else:
+        source = io.StringIO("\n".join(lines), newline="\n")
+    streamed = []
+    try:
+        for form in BParser.parse_stream(source):
+            streamed.append(comparable(form))
+    except BParserError as error:
+        streamed = (False, str(error))
+    else:
+        streamed = (True, streamed)
+    if streamed[0] != expected[0] or (expected[0] and streamed[1] != expected[1]):
+        return f"parse_stream returned {streamed}, expected {expected}"
+    return None
+
+
+def main():
+    """main entrypoint: fuzzes for the given number of iterations, with the given random seed"""
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else ITERATIONS
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    rng = random.Random(seed)
+    programs = []
+    for path in sorted(glob.glob("v*/**/*.brewin", recursive=True)):
+        with open(path, encoding="utf-8") as handle:
+            programs.append(handle.read())
+    for iteration in range(iterations):
+        lines = mutated_lines(rng, programs) if rng.random() < 0.5 else random_lines(rng)
+        failure = check(lines)
+        if failure is not None:
+            print(f"iteration {iteration}: BParser disagrees with reference_parse on {lines!r}")
+            print(failure)
+            sys.exit(1)
+    print(f"{iterations} inputs parsed identically")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,77 @@
+import sys
+
 from v3_class import ClassDef
 from intbase import InterpreterBase, ErrorType
 from bparser import BParser
 from v3_object import ObjectDef
+from v3_compiler import MethodCompiler
+from v3_closure import ClosureCompiler
+from v3_bytecode import BytecodeCompiler
 from v3_type_value import TypeManager
-import copy
+from v3_cache import source_digest
+from v3_stack import DeepStackWorker
 
 # need to document that each class has at least one method guaranteed
 
 # Main interpreter class
 class Interpreter(InterpreterBase):
-    def __init__(self, console_output=True, inp=None, trace_output=False):
+    # execution engines; see v3_ast.py, v3_closure.py and v3_bytecode.py
+    ENGINE_AST = "ast"
+    ENGINE_CLOSURE = "closure"
+    ENGINE_BYTECODE = "bytecode"
+    ENGINES = (ENGINE_AST, ENGINE_CLOSURE, ENGINE_BYTECODE)
+
+    # the most method calls that may be active at once, in every engine (see ObjectDef.run_method)
+    DEFAULT_RECURSION_LIMIT = 100000
+    # the ast and closure engines run each Brewin call on Python's own stack, taking a few Python frames per call
+    # for the statements and expressions it's in the middle of; while they run a program, Python's recursion limit
+    # is raised to leave room for this many per call, so recursion_limit is what stops a deep recursion
+    PYTHON_FRAMES_PER_CALL = 20
+    # the raised limit is capped at MAX_PYTHON_RECURSION_LIMIT, and the program runs on a thread with a stack of
+    # PYTHON_STACK_SIZE bytes. Python 3.11 doesn't use the C stack for calls between Python functions, but a frame
+    # called through C code (a builtin, a property, __eq__) takes about 640 bytes of it: enough of those, in a
+    # process's 8 MiB main thread, crash it instead of raising RecursionError. The stack leaves 1 KiB for every
+    # frame up to the cap, so even a recursion that goes through C for every frame stops with a RecursionError.
+    # A recursion deeper than the cap allows is reported as a FAULT_ERROR all the same, with no line number
+    MAX_PYTHON_RECURSION_LIMIT = 500000
+    PYTHON_STACK_SIZE = 512 * 1024 * 1024
+    # the thread, shared by every Interpreter in the process, that runs them (see v3_stack.py)
+    DEEP_STACK_WORKER = DeepStackWorker(PYTHON_STACK_SIZE, "brewin-deep-stack")
+
+    # with strict set, names that can't be resolved when a method is compiled are reported as errors right away,
+    # instead of when (and if) the code that uses them runs; see get_diagnostics()
+    # program_cache is a ProgramCache (see v3_cache.py) shared by interpreters that run the same programs, or None
+    def __init__(
+        self,
+        console_output=True,
+        inp=None,
+        trace_output=False,
+        engine=ENGINE_AST,
+        strict=False,
+        recursion_limit=DEFAULT_RECURSION_LIMIT,
+        program_cache=None,
+    ):
         super().__init__(console_output, inp)
         self.trace_output = trace_output
+        self.strict = strict
+        self.recursion_limit = recursion_limit
+        self.call_depth = 0  # the method calls that are active
+        self.program_cache = program_cache
+        self.diagnostics = []  # (error_type, description, line_num) for each problem found while compiling
+        if engine not in Interpreter.ENGINES:
+            raise ValueError(f"Unknown execution engine {engine}")
+        self.engine = engine
+        self.compiler = MethodCompiler(self)
+        self.closure_compiler = ClosureCompiler(self)
+        self.bytecode_compiler = BytecodeCompiler(self)
+        self.call_site_caches = []  # one CallSiteCache per compiled (call ...) expression
+        self.specializations = []  # see get_template_specializations()
 
-    # run a program, provided in an array of strings, one string per line of source code
+    # run a program, provided in an array of strings, one string per line of source code, or any other iterable of
+    # lines such as an open file (see BParser.parse_stream)
     # usese the provided BParser class found in parser.py to parse the program into lists
     def run(self, program):
-        status, parsed_program = BParser.parse(program)
-        if not status:
-            super().error(
-                ErrorType.SYNTAX_ERROR, f"Parse error on program: {parsed_program}"
-            )
-        self.__add_all_class_types_to_type_manager(parsed_program)
-        self.__map_class_names_to_class_defs(parsed_program)
+        self.load(program)
 
         # instantiate main class
         invalid_line_num_of_caller = None
@@ -31,12 +80,76 @@ class Interpreter(InterpreterBase):
         )
 
         # call main function in main class; return value is ignored from main
-        self.main_object.call_method(
-            InterpreterBase.MAIN_FUNC_DEF, [], False, invalid_line_num_of_caller
-        )
+        self.call_depth = 0
+        if self.engine == Interpreter.ENGINE_BYTECODE or sys.version_info < (3, 11):
+            self.__call_main()
+        else:
+            self.__call_main_on_deep_stack()
 
         # program terminates!
 
+    # calls main in the main class, reporting a Python RecursionError as a FAULT_ERROR
+    def __call_main(self):
+        invalid_line_num_of_caller = None
+        try:
+            self.main_object.call_method(
+                InterpreterBase.MAIN_FUNC_DEF, [], False, invalid_line_num_of_caller
+            )
+        except RecursionError:
+            # methods nested deeper than PYTHON_FRAMES_PER_CALL can still run out of Python's stack first; it's
+            # unwound by the time we get here
+            super().error(ErrorType.FAULT_ERROR, "maximum recursion depth exceeded")
+
+    # runs __call_main() for the ast and closure engines: on the DEEP_STACK_WORKER thread, which has a
+    # PYTHON_STACK_SIZE stack, with Python's recursion limit raised by enough for recursion_limit Brewin calls (up to
+    # MAX_PYTHON_RECURSION_LIMIT) while it runs. The limit is put back afterwards, however the program ends, unless
+    # something else has changed it since; an error the program ends with is raised again here
+    def __call_main_on_deep_stack(self):
+        def call_main():
+            previous_limit = sys.getrecursionlimit()
+            raised_limit = max(
+                previous_limit,
+                min(
+                    previous_limit + self.recursion_limit * Interpreter.PYTHON_FRAMES_PER_CALL,
+                    Interpreter.MAX_PYTHON_RECURSION_LIMIT,
+                ),
+            )
+            sys.setrecursionlimit(raised_limit)
+            try:
+                self.__call_main()
+            finally:
+                if sys.getrecursionlimit() == raised_limit:
+                    sys.setrecursionlimit(previous_limit)
+
+        Interpreter.DEEP_STACK_WORKER.call(call_main)
+
+    # parse a program, or take its parse tree from the program cache, and build (and compile) its class definitions
+    # without running it
+    def load(self, program):
+        cache = self.program_cache
+        if cache is None:
+            self.__load_parsed_program(self.__parse(program))
+            return
+        program, digest = source_digest(program)
+        parsed_program = cache.get(digest)
+        if parsed_program is None:
+            parsed_program = self.__parse(program)
+            cache.put(digest, parsed_program)
+        self.__load_parsed_program(parsed_program)
+
+    def __parse(self, program):
+        # names are interned plain strs, and line numbers are kept by the lists they're in; see BParser.parse
+        status, parsed_program = BParser.parse(program, compact=True)
+        if not status:
+            super().error(
+                ErrorType.SYNTAX_ERROR, f"Parse error on program: {parsed_program}"
+            )
+        return parsed_program
+
+    def __load_parsed_program(self, parsed_program):
+        self.__add_all_class_types_to_type_manager(parsed_program)
+        self.__map_class_names_to_class_defs(parsed_program)
+
     def is_initializer_str(self, class_name):
         return class_name.split(InterpreterBase.TYPE_CONCAT_CHAR)[0] in self.type_manager.map_template_class_name_to_class_def
 
@@ -44,29 +157,56 @@ class Interpreter(InterpreterBase):
     # if the user tries to new an class name that does not exist. This will report the line number of the statement
     # with the new command
     def instantiate(self, class_name, line_num_of_statement):
-        if class_name not in self.class_index and not self.is_initializer_str(class_name):
-            super().error(
-                ErrorType.TYPE_ERROR,
-                f"No class named {class_name} found",
-                line_num_of_statement,
-            )
-        
-
-        # Check if this is a template class
-        # If it contains @, then it's actually an initializer string!
-        if self.is_initializer_str(class_name):
-            initializer_str = class_name
-            class_def = self.create_class_def_from_template(initializer_str)
-        # Default - assume it's a regular class
-        # Additionally, if template was already used, then it's cached
-        else:
-            class_def = self.class_index[class_name]
-
+        class_def = self.get_class_def_to_instantiate(class_name, line_num_of_statement)
         obj = ObjectDef(
-            self, class_def, None, self.trace_output
+            self, class_def, self.trace_output
         )  # Create an object based on this class definition
         return obj
 
+    # returns the ClassDef that instantiate() creates objects of for class_name, reporting an error if there isn't
+    # one; the result never changes once the program is loaded, so (new ...) expressions look it up once (see NewNode
+    # in v3_ast.py)
+    def get_class_def_to_instantiate(self, class_name, line_num_of_statement):
+        # classes built from templates are in the class index too (see __instantiate_templates)
+        class_def = self.class_index.get(class_name)
+        if class_def is None:
+            if not self.is_initializer_str(class_name):
+                super().error(
+                    ErrorType.TYPE_ERROR,
+                    f"No class named {class_name} found",
+                    line_num_of_statement,
+                )
+            # a template class initializer that wasn't built when the program was loaded; this reports why
+            class_def = self.create_class_def_from_template(class_name, line_num_of_statement)
+        return class_def
+
+    # compiles the body of a method_def of class_def into v3_ast nodes, and then into closures or bytecode if one of
+    # those engines was selected; called once per method as each ClassDef is built
+    def compile_method(self, class_def, method_def):
+        self.compiler.compile_method(class_def, method_def)
+        if self.engine == Interpreter.ENGINE_CLOSURE:
+            self.closure_compiler.compile_method(method_def)
+        elif self.engine == Interpreter.ENGINE_BYTECODE:
+            self.bytecode_compiler.compile_method(method_def)
+
+    # returns the hit and miss counts of the call site caches, summed over every call site in the program
+    def get_call_site_stats(self):
+        return {
+            "call_sites": len(self.call_site_caches),
+            "hits": sum(cache.hits for cache in self.call_site_caches),
+            "misses": sum(cache.misses for cache in self.call_site_caches),
+        }
+
+    # records a problem MethodCompiler found in a method, which is an error only if the code containing it runs
+    def report_diagnostic(self, error_type, description, line_num):
+        if self.strict:
+            super().error(error_type, description, line_num)
+        self.diagnostics.append((error_type, description, line_num))
+
+    # returns the problems found while compiling the methods loaded so far, as (error_type, description, line_num)
+    def get_diagnostics(self):
+        return self.diagnostics
+
     # returns a ClassDef object
     def get_class_def(self, class_name, line_number_of_statement):
         if class_name not in self.class_index:
@@ -93,23 +233,12 @@ class Interpreter(InterpreterBase):
 
     def __map_class_names_to_class_defs(self, program):
         self.class_index = {}
+        self.specializations = []
+        # template classes are set up first, so that every specialization the program names can be built before the
+        # classes that use it (e.g. as the type of a field)
+        template_class_defs = {}
         for item in program:
-            if item[0] == InterpreterBase.CLASS_DEF:
-                if item[1] in self.class_index:
-                    super().error(
-                        ErrorType.TYPE_ERROR,
-                        f"Duplicate class name {item[1]}",
-                        item[0].line_num,
-                    )
-                self.class_index[item[1]] = ClassDef(item, self)
-            elif item[0] == InterpreterBase.TEMPLATE_CLASS_DEF:
-                if item[1] in self.class_index:
-                    super().error(
-                        ErrorType.TYPE_ERROR,
-                        f"Duplicate class name {item[1]}",
-                        item[0].line_num,
-                    )
-                
+            if item[0] == InterpreterBase.TEMPLATE_CLASS_DEF and item[1] not in template_class_defs:
                 # Template class, we need to set parameter types as well
                 # 1. Show it's a template with a boolean
                 template_class_def = ClassDef(item, self, is_template_class=True)
@@ -117,8 +246,99 @@ class Interpreter(InterpreterBase):
                 # 2. Parse the parameters and put it in the class definition
                 template_class_def.set_parameter_type_strings(item[2])
 
-                self.class_index[item[1]] = template_class_def
+                template_class_defs[item[1]] = template_class_def
                 self.type_manager.add_template_class_type(item[1], template_class_def)
+        if template_class_defs:
+            self.__instantiate_templates(program)
+
+        class_names = set()
+        for item in program:
+            if item[0] == InterpreterBase.CLASS_DEF or item[0] == InterpreterBase.TEMPLATE_CLASS_DEF:
+                if item[1] in class_names:
+                    super().error(
+                        ErrorType.TYPE_ERROR,
+                        f"Duplicate class name {item[1]}",
+                        item.line_num,
+                    )
+                class_names.add(item[1])
+            if item[0] == InterpreterBase.CLASS_DEF:
+                self.class_index[item[1]] = ClassDef(item, self)
+            elif item[0] == InterpreterBase.TEMPLATE_CLASS_DEF:
+                self.class_index[item[1]] = template_class_defs[item[1]]
+
+    # builds a class for every valid template class initializer in the program (e.g. node@int) before the program's
+    # own classes are built, along with those named in the classes built from them, until there are no new ones; at
+    # run time the class of an initializer is then already in the class index. All of their types are added before
+    # any of the classes is built, since they may name each other. Initializers that aren't valid, and classes whose
+    # body has an error for the types they're given (e.g. a field of parameter type T with an int default, for
+    # T=string), are left to create_class_def_from_template(), so the error is still reported when (and if) the code
+    # using one runs.
+    def __instantiate_templates(self, program):
+        pending = []  # (initializer, line_num), in the order they appear
+        for item in program:
+            if item[0] == InterpreterBase.CLASS_DEF:
+                self.__find_initializers(item, item.line_num, pending)
+        specialized = {}  # initializer -> (class source, line_num)
+        next_index = 0
+        while next_index < len(pending):
+            initializer, line_num = pending[next_index]
+            next_index += 1
+            if initializer in specialized:
+                continue
+            if not self.type_manager.is_template_class_initializer_str_valid(initializer):
+                continue
+            class_source = self.__specialize_template(initializer)
+            specialized[initializer] = (class_source, line_num)
+            self.__find_initializers(class_source, line_num, pending)
+        for initializer, (class_source, line_num) in specialized.items():
+            self.__try_add_template_class_def(initializer, class_source, line_num)
+
+    # __add_template_class_def(), except that if building the class reports an error, everything it added is taken
+    # back (including the type) and the error is dropped
+    def __try_add_template_class_def(self, template_class_initializer, template_class_source, line_num):
+        call_sites = len(self.call_site_caches)
+        diagnostics = len(self.diagnostics)
+        try:
+            self.__add_template_class_def(template_class_initializer, template_class_source, line_num)
+        except RuntimeError:
+            # the class index and the specializations only get the class once it's built
+            self.type_manager.remove_class_type(template_class_initializer)
+            del self.call_site_caches[call_sites:]
+            del self.diagnostics[diagnostics:]
+            self.error_type = None
+            self.error_line = None
+
+    # appends (initializer, line_num) to found for each template class initializer in code, which is a parsed
+    # statement, expression or whole class; string constants are skipped
+    def __find_initializers(self, code, line_num, found):
+        line_num = getattr(code, "line_num", None) or line_num
+        for item in code:
+            if isinstance(item, list):
+                self.__find_initializers(item, line_num, found)
+            elif (
+                InterpreterBase.TYPE_CONCAT_CHAR in item
+                and not item.startswith('"')
+                and self.is_initializer_str(item)
+            ):
+                found.append((item, line_num))
+
+    # returns the classes built from templates so far, in the order they were built, as (class name, template name,
+    # provided types, line_num) where line_num is the line that first named the class
+    def get_template_specializations(self):
+        return self.specializations
+
+    # returns a report of get_template_specializations(), one line per class, e.g.
+    # "line 9: pair@int@bool from pair (a=int, b=bool)"
+    def format_template_specializations(self):
+        lines = []
+        for class_name, template_name, provided_types, line_num in self.specializations:
+            template_class_def = self.type_manager.map_template_class_name_to_class_def[template_name]
+            bindings = ", ".join(
+                f"{parameter}={provided_type}"
+                for parameter, provided_type in zip(template_class_def.parameter_type_strings, provided_types)
+            )
+            lines.append(f"line {line_num}: {class_name} from {template_name} ({bindings})")
+        return "\n".join(lines)
 
     # [class classname inherits superclassname [items]]
     def __add_all_class_types_to_type_manager(self, parsed_program):
@@ -132,51 +352,48 @@ class Interpreter(InterpreterBase):
                 self.type_manager.add_class_type(class_name, superclass_name)
             # Note: we add template class types AFTER provided parameters
 
-    def create_class_def_from_template(self, template_class_initializer):
-        # Process this string
-        template_class_name, provided_types = self.type_manager.split_template_class_initializer(template_class_initializer)
+    # line_num is the line of the statement or member that names the instantiated class, used to report errors
+    def create_class_def_from_template(self, template_class_initializer, line_num=None):
+        # Check if this class has already been initialized
+        class_def = self.class_index.get(template_class_initializer)
+        if class_def is not None:
+            # If so, then we can just return it
+            return class_def
 
         # Verify that the class is valid
         if not self.type_manager.is_template_class_initializer_str_valid(template_class_initializer):
             super().error(
                 ErrorType.TYPE_ERROR,
                 f"Invalid template class initializer: {template_class_initializer}",
-                template_class_initializer.line_num, # TO-DO: Will this work?
+                line_num,
             )
 
-        # Check if this class has already been initialized
-        if template_class_initializer in self.class_index:
-            # If so, then we can just return it
-            return self.class_index[template_class_initializer]
+        template_class_source = self.__specialize_template(template_class_initializer)
+        return self.__add_template_class_def(template_class_initializer, template_class_source, line_num)
 
+    # returns the source of the class a valid template class initializer names, and adds its type
+    def __specialize_template(self, template_class_initializer):
+        template_class_name, provided_types = self.type_manager.split_template_class_initializer(template_class_initializer)
         template_class_def = self.type_manager.map_template_class_name_to_class_def[template_class_name]
 
-        # Create a deepcopy of this source
-        # Mutate this so it looks like a real class
-        template_class_source = copy.deepcopy(template_class_def.class_source)
-        template_class_source[0] = InterpreterBase.CLASS_DEF
-        template_class_source[1] = template_class_initializer
-        del template_class_source[2]  # Delete the parameter types
-
-        # Recursively find and replace all parameter types in class_source with provided types
-        for x in range(len(provided_types)):
-            # Template type = what's in the template class definition already
-            template_type = template_class_def.parameter_type_strings[x]
-            # Provided type is what the user gave, that we're replacing it with
-            provided_type = provided_types[x]
-            
-            template_class_source = self.type_manager.replace_parameter_strings(template_class_source, template_type, provided_type)
+        # Build the source of a real class from the template, with the provided types in place of its parameters
+        template_class_source = template_class_def.template.instantiate(template_class_initializer, provided_types)
 
         # Attach this to the type mananger
         # Note: there's no super class for this
         self.type_manager.add_class_type(template_class_initializer, None)
+        return template_class_source
 
+    # builds the class of a template class initializer from the source __specialize_template() returned
+    def __add_template_class_def(self, template_class_initializer, template_class_source, line_num):
         # Create a new class definition with this new source
         # Note: This class is not a template, so we pass in False
         new_class_def = ClassDef(template_class_source, self)
         self.class_index[template_class_initializer] = new_class_def
+        template_class_name, provided_types = self.type_manager.split_template_class_initializer(template_class_initializer)
+        self.specializations.append((template_class_initializer, template_class_name, tuple(provided_types), line_num))
 
-        return new_class_def    
+        return new_class_def
 
 # CODE FOR DEBUGGING PURPOSES ONLY
 if __name__ == "__main__":
@@ -0,0 +1,112 @@
+"""
+Tests for v3_cache.ProgramCache; entry point is `python3 -m unittest test_program_cache`.
+Programs run through a cache must behave exactly as they do when they're loaded cold, with every
+Interpreter building its own classes from the cached parse tree.
+"""
+
+import copy
+import os
+import tempfile
+import unittest
+
+from interpreterv3 import Interpreter
+from v3_cache import ProgramCache, source_digest
+
+# a program with a template class, call sites and a field, so that a run leaves state behind in its interpreter
+PROGRAM = "v3/tests/test_template3.brewin"
+
+
+def read_lines(path):
+    """the lines of a test program, as tester.py passes them to the interpreter"""
+    with open(path, encoding="utf-8") as handle:
+        return handle.readlines()
+
+
+def run(program, engine=Interpreter.ENGINE_AST, cache=None):
+    """runs program with a new Interpreter and returns the interpreter"""
+    interpreter = Interpreter(False, engine=engine, program_cache=cache)
+    interpreter.run(program)
+    return interpreter
+
+
+class ProgramCacheTest(unittest.TestCase):
+    """ProgramCache hits, misses and eviction, and what interpreters share through it"""
+
+    def setUp(self):
+        self.program = read_lines(PROGRAM)
+        self.expected = [line.rstrip("\n") for line in read_lines(PROGRAM[: -len(".brewin")] + ".exp")]
+
+    def test_memory_hit(self):
+        """a second run of a program takes its parse tree from memory and builds its own classes from it"""
+        for engine in Interpreter.ENGINES:
+            with self.subTest(engine=engine):
+                cold = run(self.program, engine)
+                cache = ProgramCache()
+                first = run(self.program, engine, cache)
+                second = run(self.program, engine, cache)
+                self.assertEqual(cache.get_stats()["hits"], 1)
+                self.assertEqual(cache.get_stats()["misses"], 1)
+                self.assertEqual(second.get_output(), self.expected)
+                self.assertEqual(second.get_call_site_stats(), cold.get_call_site_stats())
+                self.assertEqual(second.get_template_specializations(), cold.get_template_specializations())
+                for class_name, class_def in second.class_index.items():
+                    self.assertIs(class_def.interpreter, second)
+                    self.assertIsNot(class_def, first.class_index[class_name])
+
+    def test_disk_hit(self):
+        """a new cache on the same directory loads the pickled parse tree, and runs as a cold load does"""
+        with tempfile.TemporaryDirectory() as directory:
+            run(self.program, cache=ProgramCache(directory=directory))
+            cache = ProgramCache(directory=directory)
+            interpreter = run(self.program, cache=cache)
+            stats = cache.get_stats()
+            self.assertEqual((stats["disk_hits"], stats["disk_misses"]), (1, 0))
+            self.assertEqual(interpreter.get_output(), run(self.program).get_output())
+            self.assertEqual(interpreter.get_output(), self.expected)
+
+    def test_unreadable_pickle(self):
+        """a pickle that can't be loaded, whatever it fails with, is a miss, and the program is parsed again"""
+        digest = source_digest(self.program)[1]
+        contents = [
+            b"",  # EOFError
+            b"not a pickle",  # UnpicklingError
+            b"cv3_cache\nNoSuchName\n.",  # AttributeError: names something that has gone
+            b"cno_such_module\nname\n.",  # ModuleNotFoundError
+        ]
+        for content in contents:
+            with self.subTest(content=content), tempfile.TemporaryDirectory() as directory:
+                with open(os.path.join(directory, digest + ".pickle"), "wb") as handle:
+                    handle.write(content)
+                cache = ProgramCache(directory=directory)
+                interpreter = run(self.program, cache=cache)
+                stats = cache.get_stats()
+                self.assertEqual((stats["disk_hits"], stats["disk_misses"]), (0, 1))
+                self.assertEqual(interpreter.get_output(), self.expected)
+
+    def test_lru_eviction(self):
+        """past max_entries, the least recently used parse tree is dropped"""
+        cache = ProgramCache(max_entries=2)
+        programs = [self.program, read_lines("v3/tests/test_lexing.brewin"), read_lines("v3/tests/test_try.brewin")]
+        digests = [source_digest(program)[1] for program in programs]
+        for program in programs[:2]:
+            Interpreter(False, program_cache=cache).load(program)
+        # using the first makes the second the least recently used, so the third replaces it
+        self.assertIsNotNone(cache.get(digests[0]))
+        Interpreter(False, program_cache=cache).load(programs[2])
+        self.assertEqual(list(cache.programs), [digests[0], digests[2]])
+        self.assertIsNone(cache.get(digests[1]))
+        self.assertEqual(cache.get_stats()["entries"], 2)
+
+    def test_load_leaves_parse_tree_unchanged(self):
+        """loading and running a program doesn't change the parse tree other interpreters will load"""
+        cache = ProgramCache()
+        digest = source_digest(self.program)[1]
+        run(self.program, cache=cache)
+        parsed_program = copy.deepcopy(cache.get(digest))
+        for engine in Interpreter.ENGINES:
+            run(self.program, engine, cache)
+        self.assertEqual(cache.get(digest), parsed_program)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,6 +3,7 @@ Implements all CS 131-related test logic; is entry-point for testing framework.
 """
 
 import asyncio
+import contextlib
 import importlib
 from os import environ
 import os
@@ -21,8 +22,9 @@ from harness import (
 class TestScaffold(AbstractTestScaffold):
     """Implement scaffold for Brewin' interpreter; load file, validate syntax, run testcase."""
 
-    def __init__(self, interpreter_lib):
+    def __init__(self, interpreter_lib, interpreter_args=None):
         self.interpreter_lib = interpreter_lib
+        self.interpreter_args = interpreter_args or {}  # extra keyword args, e.g. the v3 execution engine
 
     def setup(self, test_case):
         inputfile, expfile, srcfile = itemgetter("inputfile", "expfile", "srcfile")(
@@ -48,18 +50,35 @@ class TestScaffold(AbstractTestScaffold):
         }
 
     def run_test_case(self, test_case, environment):
+        recursion_limit = sys.getrecursionlimit()
+        score = self.__score_test_case(test_case, environment)
+        # an interpreter that changes Python's recursion limit while it runs a program (the v3 one does) has to put
+        # it back however the program ends, including with an error
+        if sys.getrecursionlimit() != recursion_limit:
+            print("\nPython's recursion limit was left at", sys.getrecursionlimit(), "instead of", recursion_limit)
+            sys.setrecursionlimit(recursion_limit)
+            return 0
+        return score
+
+    def __score_test_case(self, test_case, environment):
         expect_failure = itemgetter("expect_failure")(test_case)
         stdin, expected, program = itemgetter("stdin", "expected", "program")(
             environment
         )
-        interpreter = self.interpreter_lib.Interpreter(False, stdin, False)
+        interpreter = self.interpreter_lib.Interpreter(
+            False, stdin, False, **self.interpreter_args
+        )
         try:
             interpreter.validate_program(program)
-            interpreter.run(program)
+            with open_program(test_case, program) as source:
+                interpreter.run(source)
         except Exception as exception:  # pylint: disable=broad-except
             if expect_failure:
-                error_type, _ = interpreter.get_error_type_and_line()
+                error_type, error_line = interpreter.get_error_type_and_line()
                 received = [f"{error_type}"]
+                if len(expected) > 1:
+                    # the .exp file gives the line the error is reported on, too
+                    received.append(f"line {error_line}")
                 if received == expected:
                     return 1
                 print("\nExpected error:")
@@ -89,17 +108,32 @@ class TestScaffold(AbstractTestScaffold):
         return int(passed)
 
 
+def open_program(test_case, program):
+    """
+    Context manager for the program a test case runs, as given to the interpreter: the list of its
+    lines, or, for a test case with a "source", an open file or a generator of its lines.
+    """
+    match test_case.get("source"):
+        case "file":
+            return open(test_case["srcfile"], encoding="utf-8")
+        case "generator":
+            return contextlib.nullcontext(line for line in program)
+        case _:
+            return contextlib.nullcontext(program)
+
+
 def __generate_test_case_structure(
-    cases, directory, category="", expect_failure=False, visible=lambda _: True
+    cases, directory, category="", expect_failure=False, visible=lambda _: True, source=None
 ):
     return [
         {
-            "name": f"{category} | {i}",
+            "name": f"{category} | {i}" + (f" ({source})" if source else ""),
             "inputfile": f"{directory}{i}.in",
             "srcfile": f"{directory}{i}.brewin",
             "expfile": f"{directory}{i}.exp",
             "expect_failure": expect_failure,
             "visible": visible(f"test{i}"),
+            "source": source,
         }
         for i in cases
     ]
@@ -146,13 +180,22 @@ def generate_test_suite_v2():
     return __generate_test_suite(2, test_files, fail_files)
 
 test_files = [
+    "test_call_site_cache",
+    "test_constant_folding",
+    "test_control_flow",
+    "test_deep_recursion",
     "test_default_fields",
     "test_default_locals",
+    "test_local_slots",
+    "test_operator_sites",
+    "test_lexing",
+    "test_stream_source",
     "test_except1",
     "test_except13",
     "pisk_except_in_catch",
     "pisk_nested_try",
     "test_str_ops",
+    "test_tail_calls",
     "pisk_template_class_only",
     "test_template",
     "test_template1",
@@ -162,20 +205,29 @@ test_files = [
     "test_template8",
     "test_template9",
     "test_template_test",
+    "test_template_substitution",
+    "test_template_fields",
+    "test_template_unreached",
     "test_throw",
     "test_throw2",
     "test_throw3",
     "test_throw4",
     "test_throw5",
     "test_try",
-    "test_try1"
+    "test_try1",
+    "test_unresolved_name"
 ]
 
 fail_files = [
     "pisk_test_except1",
     "pisk_test_except2",
+    "test_dup_formal_params",
     "test_except4",
     "test_incompat_template_types",
+    "test_infinite_recursion",
+    "test_let_nonconstant",
+    "test_stream_line_number",
+    "test_tail_call_return_type",
     "test_template10",
     "test_template11",
     "test_template5",
@@ -186,9 +238,21 @@ fail_files = [
 ]
 
 
+# v3 tests that are also run with the program read from an open file, and from a generator of its lines
+stream_test_files = ["test_stream_source"]
+stream_fail_files = ["test_stream_line_number"]
+
+
 def generate_test_suite_v3():
     """wrapper for generate_test_suite for v3"""
-    return __generate_test_suite(3, test_files, fail_files)
+    suite = __generate_test_suite(3, test_files, fail_files)
+    for source in ("file", "generator"):
+        suite += __generate_test_case_structure(
+            stream_test_files, "v3/tests/", "Correctness", False, source=source
+        ) + __generate_test_case_structure(
+            stream_fail_files, "v3/fails/", "Incorrectness", True, source=source
+        )
+    return suite
 
 
 async def main():
@@ -199,7 +263,12 @@ async def main():
     module_name = f"interpreterv{version}"
     interpreter = importlib.import_module(module_name)
 
-    scaffold = TestScaffold(interpreter)
+    # optional second argument selects the execution engine, e.g. `python3 tester.py 3 closure` or `python3 tester.py 3 bytecode`
+    interpreter_args = {}
+    if len(sys.argv) > 2:
+        interpreter_args["engine"] = sys.argv[2]
+
+    scaffold = TestScaffold(interpreter, interpreter_args)
 
     match version:
         case "1":
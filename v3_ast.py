@@ -0,0 +1,731 @@
+"""
+Compiled form of a method body. MethodCompiler (v3_compiler.py) turns the nested lists produced by BParser into
+a tree of the node classes below once, when a class definition is loaded; running a method then just walks the
+tree, with every node knowing how to execute itself instead of re-dispatching on its keyword token.
+
+Statement nodes implement execute(obj, frame), which returns None when execution should go on with the next
+statement, or else the Value the method is leaving with: the value of a return statement, or an exception (a Value
+of ObjectDef.EXCEPTION_TYPE_CONST). Expression nodes implement evaluate(obj, frame), which returns a Value; an
+exception raised inside an expression is its value. In both cases obj is the ObjectDef whose method is running, and
+frame is the list of parameter and local Values of the call (see v3_env.py).
+"""
+
+from intbase import InterpreterBase, ErrorType
+from v3_callsite import CallSiteCache
+from v3_env import TailCall
+from v3_object import ObjectDef
+from v3_operators import BOOL_RESULT_OPERATORS, PYTHON_OPERATORS, BinaryOpSite
+from v3_type_value import create_default_value
+from v3_type_value import Type, Value, bool_value, int_value, null_value, string_value
+
+
+# this method checks to see if a variable holds a null value, and if so, changes the type of the null value
+# to the type of the variable; fields are handled by ObjectDef.get_field()
+def propagate_type_to_null(value, var_type):
+    if value.is_null():
+        return null_value(var_type)
+    return value
+
+
+class StatementNode:
+    # code is the statement as produced by BParser; it's kept around for error messages and tracing
+    def __init__(self, code, line_num):
+        self.code = code
+        self.line_num = line_num
+
+    def execute(self, obj, frame):
+        raise NotImplementedError
+
+
+class ExpressionNode:
+    # line_num is the line of the enclosing statement, which is what errors inside expressions are reported with
+    def __init__(self, line_num):
+        self.line_num = line_num
+
+    def evaluate(self, obj, frame):
+        raise NotImplementedError
+
+
+# prints every statement before it runs when the interpreter was created with trace_output=True
+class TraceNode(StatementNode):
+    def __init__(self, statement):
+        super().__init__(statement.code, statement.line_num)
+        self.statement = statement
+
+    def execute(self, obj, frame):
+        print(f"{self.line_num}: {self.code}")
+        return self.statement.execute(obj, frame)
+
+
+# statements which are malformed or whose keyword is unknown are reported when (and only if) they run
+class InvalidStatementNode(StatementNode):
+    def __init__(self, code, line_num, description, error_type=ErrorType.SYNTAX_ERROR):
+        super().__init__(code, line_num)
+        self.description = description
+        self.error_type = error_type
+
+    def execute(self, obj, frame):
+        obj.interpreter.error(self.error_type, self.description, self.line_num)
+
+
+# (begin (statement1) (statement2) ... (statementn))
+class BeginNode(StatementNode):
+    def __init__(self, code, line_num, statements):
+        super().__init__(code, line_num)
+        self.statements = statements
+
+    def execute(self, obj, frame):
+        for statement in self.statements:
+            result = statement.execute(obj, frame)
+            if result is not None:
+                return result  # could be a valid return of a value or an error
+        # if we run through the entire block without a return, then just proceed
+        # we don't want the enclosing block to exit with a return
+        return None
+
+
+# (let ((type1 var1 defval1) (type2 var2 defval2)) (statement1) (statement2) ...)
+# var_defs holds the raw (typename varname [defvalue]) lists
+class LetNode(BeginNode):
+    # local_defs holds a (template class initializer or None, Type, initial Value, varname, slot, is_duplicate) tuple
+    # for each local, resolved by MethodCompiler; the initial value is None if it isn't a constant, which is reported
+    # when the let runs
+    def __init__(self, code, line_num, local_defs, statements):
+        super().__init__(code, line_num, statements)
+        self.local_defs = local_defs
+
+    def execute(self, obj, frame):
+        self.__add_locals_to_frame(obj, frame)
+        return super().execute(obj, frame)
+
+    # initialize all local variables defined in a let
+    def __add_locals_to_frame(self, obj, frame):
+        interpreter = obj.interpreter
+        for template_initializer, var_type, initial_value, var_name, slot, is_duplicate in self.local_defs:
+            # Handle templated class types that weren't built when the program was loaded
+            if template_initializer is not None:
+                interpreter.create_class_def_from_template(template_initializer, self.line_num)
+
+            # make sure default value for each local is of a matching type
+            if initial_value is None:
+                interpreter.error(
+                    ErrorType.SYNTAX_ERROR,
+                    "initial value of local variable " + var_name + " must be a constant",
+                    self.line_num,
+                )
+            obj.check_type_compatibility(var_type, initial_value.type(), True, self.line_num)
+            if is_duplicate:
+                interpreter.error(
+                    ErrorType.NAME_ERROR,
+                    "duplicate local variable name " + var_name,
+                    self.line_num,
+                )
+            frame[slot] = initial_value
+
+
+# (set varname expression)
+class SetNode(StatementNode):
+    # target is the LocalNode, FieldNode or UnresolvedNameNode that var_name resolved to
+    def __init__(self, code, line_num, target, expression):
+        super().__init__(code, line_num)
+        self.target = target
+        self.expression = expression
+
+    def execute(self, obj, frame):
+        val = self.expression.evaluate(obj, frame)
+        # Halt execution and immediately leave upon seeing error
+        if val.t is ObjectDef.EXCEPTION_TYPE_CONST:
+            return val
+
+        # checks/reports type and name errors
+        self.target.assign(obj, frame, val)
+        return None
+
+
+# (if expression (statement) [(statement)])
+class IfNode(StatementNode):
+    def __init__(self, code, line_num, condition, then_statement, else_statement):
+        super().__init__(code, line_num)
+        self.condition = condition
+        self.then_statement = then_statement
+        self.else_statement = else_statement  # None if there's no else clause
+
+    def execute(self, obj, frame):
+        condition = self.condition.evaluate(obj, frame)
+
+        # Halt execution and immediately leave upon seeing error
+        if condition.t is ObjectDef.EXCEPTION_TYPE_CONST:
+            return condition
+
+        if condition.t is not ObjectDef.BOOL_TYPE_CONST:
+            obj.interpreter.error(
+                ErrorType.TYPE_ERROR,
+                "non-boolean if condition " + " ".join(x for x in self.code[1]),
+                self.line_num,
+            )
+        if condition.value():
+            return self.then_statement.execute(obj, frame)  # if condition was true
+        if self.else_statement is not None:
+            return self.else_statement.execute(obj, frame)  # if condition was false, do else
+        return None
+
+
+# (while expression (statement))
+class WhileNode(StatementNode):
+    def __init__(self, code, line_num, condition, body):
+        super().__init__(code, line_num)
+        self.condition = condition
+        self.body = body
+
+    def execute(self, obj, frame):
+        while True:
+            condition = self.condition.evaluate(obj, frame)
+
+            # Halt execution and immediately leave upon seeing error
+            if condition.t is ObjectDef.EXCEPTION_TYPE_CONST:
+                return condition
+
+            if condition.t is not ObjectDef.BOOL_TYPE_CONST:
+                obj.interpreter.error(
+                    ErrorType.TYPE_ERROR,
+                    "non-boolean while condition " + " ".join(x for x in self.code[1]),
+                    self.line_num,
+                )
+            if not condition.value():  # condition is false, exit loop immediately
+                return None
+            # condition is true, run body of while loop
+            result = self.body.execute(obj, frame)
+            if result is not None:
+                return result  # could be a valid return of a value or an error
+
+
+# (return [expression]); return_type is the declared return type of the enclosing method. is_tail_call is set by
+# MethodCompiler if expression is a call that no try statement of the method can catch exceptions from, in which
+# case the callee is run in place of the method (see TailCall in v3_env.py)
+class ReturnNode(StatementNode):
+    def __init__(self, code, line_num, expression, return_type, is_tail_call=False):
+        super().__init__(code, line_num)
+        self.expression = expression  # None for a bare (return)
+        self.return_type = return_type
+        self.is_tail_call = is_tail_call
+
+    def execute(self, obj, frame):
+        if self.expression is None:
+            # (return) with no return value; return default value for type
+            return create_default_value(self.return_type)
+
+        if self.is_tail_call:
+            return self.expression.evaluate_tail_call(obj, frame, self.return_type)
+
+        result = self.expression.evaluate(obj, frame)
+
+        # Halt execution and immediately leave upon seeing error
+        if result.t is ObjectDef.EXCEPTION_TYPE_CONST:
+            return result
+
+        if result.is_typeless_null():
+            obj.check_type_compatibility(self.return_type, result.type(), True, self.line_num)
+            result = null_value(self.return_type)  # propagate return type to null
+        obj.check_type_compatibility(self.return_type, result.type(), True, self.line_num)
+        return result
+
+
+# (print expression1 expression2 ...)
+class PrintNode(StatementNode):
+    def __init__(self, code, line_num, expressions):
+        super().__init__(code, line_num)
+        self.expressions = expressions
+
+    def execute(self, obj, frame):
+        output = ""
+        for expression in self.expressions:
+            # TESTING NOTE: Will not test printing of object references
+            term = expression.evaluate(obj, frame)
+            typ = term.t
+
+            # Halt execution and immediately leave upon seeing error
+            if typ is ObjectDef.EXCEPTION_TYPE_CONST:
+                return term
+
+            val = term.value()
+            if typ is ObjectDef.BOOL_TYPE_CONST:
+                val = "true" if val == True else "false"
+            # document will never print out an obj ref
+            output += str(val)
+        obj.interpreter.output(output)
+        return None
+
+
+# (inputs target_variable) or (inputi target_variable)
+class InputNode(StatementNode):
+    def __init__(self, code, line_num, target, get_string):
+        super().__init__(code, line_num)
+        self.target = target  # as in SetNode
+        self.get_string = get_string
+
+    def execute(self, obj, frame):
+        inp = obj.interpreter.get_input()
+        if self.get_string:
+            val = Value(ObjectDef.STRING_TYPE_CONST, inp)
+        else:
+            val = int_value(int(inp))
+
+        self.target.assign(obj, frame, val)
+        return None
+
+
+# (call object_ref/me/super methodname param1 param2 ...) used as a statement
+class CallStatementNode(StatementNode):
+    def __init__(self, code, line_num, call):
+        super().__init__(code, line_num)
+        self.call = call  # CallNode
+
+    def execute(self, obj, frame):
+        executed_call_value = self.call.evaluate(obj, frame)
+
+        # For an error, leave with the exception
+        if executed_call_value.t is ObjectDef.EXCEPTION_TYPE_CONST:
+            return executed_call_value
+
+        return None
+
+
+# (try (statement) (statement)); the catch statement runs with the thrown string bound to "exception"
+class TryNode(StatementNode):
+    def __init__(self, code, line_num, try_statement, catch_statement, exception_slot):
+        super().__init__(code, line_num)
+        self.try_statement = try_statement
+        self.catch_statement = catch_statement  # None if the try statement is malformed
+        self.exception_slot = exception_slot  # frame slot of the exception variable
+
+    def execute(self, obj, frame):
+        # Statement to try is always executed first
+        result = self.try_statement.execute(obj, frame)
+        if result is None or result.t is not ObjectDef.EXCEPTION_TYPE_CONST:
+            return result
+
+        # Begin executing the catch statement
+        if self.catch_statement is None:
+            obj.interpreter.error(
+                ErrorType.SYNTAX_ERROR,
+                "try statement must have two statements",
+                self.line_num,
+            )
+
+        # Add the exception variable into scope - we treat it like a local variable
+        frame[self.exception_slot] = Value(ObjectDef.STRING_TYPE_CONST, result.value())
+
+        # a return or another exception inside the catch propagates out of the try
+        return self.catch_statement.execute(obj, frame)
+
+
+# (throw expression)
+class ThrowNode(StatementNode):
+    def __init__(self, code, line_num, expression):
+        super().__init__(code, line_num)
+        self.expression = expression  # None if the throw statement is malformed
+
+    def execute(self, obj, frame):
+        # Check if throw statement was provided with an expression
+        if self.expression is None:
+            obj.interpreter.error(
+                ErrorType.SYNTAX_ERROR,
+                "throw statement must have an expression next to it",
+                self.line_num,
+            )
+
+        # Evaluate the RHS expression
+        evaluated_value = self.expression.evaluate(obj, frame)
+
+        # Check that the expression is a string type
+        if evaluated_value.t is not ObjectDef.STRING_TYPE_CONST:
+            obj.interpreter.error(
+                ErrorType.TYPE_ERROR,
+                "throw statement must throw a string",
+                self.line_num,
+            )
+
+        # Set the type of the value as exception to distinguish it from string, and throw it
+        return Value(ObjectDef.EXCEPTION_TYPE_CONST, evaluated_value.value())
+
+
+# expressions which are malformed or use an unknown operator are reported when (and only if) they're evaluated
+class InvalidExpressionNode(ExpressionNode):
+    def __init__(self, line_num, description):
+        super().__init__(line_num)
+        self.description = description
+
+    def evaluate(self, obj, frame):
+        obj.interpreter.error(ErrorType.SYNTAX_ERROR, self.description, self.line_num)
+
+
+# a bare token: a local/parameter, a field, a constant (true, 5, "blah", null) or me
+class NameNode(ExpressionNode):
+    def __init__(self, line_num, name):
+        super().__init__(line_num)
+        self.name = name
+
+
+# a parameter or let local, resolved by MethodCompiler to the innermost one in scope; it's stored in the frame at
+# slot, and is_param tells parameters (slots 0..n-1) from locals
+class LocalNode(NameNode):
+    def __init__(self, line_num, name, slot, var_type, is_param):
+        super().__init__(line_num, name)
+        self.slot = slot
+        self.var_type = var_type
+        self.is_param = is_param
+
+    def evaluate(self, obj, frame):
+        return propagate_type_to_null(frame[self.slot], self.var_type)
+
+    # checks/reports type errors
+    def assign(self, obj, frame, value):
+        obj.check_type_compatibility(self.var_type, value.type(), True, self.line_num)
+        frame[self.slot] = value
+
+
+# a field of the class whose method is running; field_index is its slot index (see ObjectLayout in v3_class.py)
+class FieldNode(NameNode):
+    def __init__(self, line_num, name, field_index):
+        super().__init__(line_num, name)
+        self.field_index = field_index
+
+    def evaluate(self, obj, frame):
+        return obj.get_field(self.field_index)
+
+    # checks/reports type errors
+    def assign(self, obj, frame, value):
+        obj.set_field(self.field_index, value, self.line_num)
+
+
+class MeNode(NameNode):
+    def evaluate(self, obj, frame):
+        return obj.get_me_as_value()  # create Value object for current object with right type
+
+
+# a name that isn't a parameter, local, field, constant or me where it's used; MethodCompiler reports these when
+# the method is compiled, but they're only errors if they're actually evaluated or assigned
+class UnresolvedNameNode(NameNode):
+    def evaluate(self, obj, frame):
+        obj.interpreter.error(
+            ErrorType.NAME_ERROR,
+            "invalid field or parameter " + self.name,
+            self.line_num,
+        )
+
+    def assign(self, obj, frame, value):
+        obj.interpreter.error(
+            ErrorType.NAME_ERROR, "unknown field/variable " + self.name, self.line_num
+        )
+
+
+# a constant like 5, "abc", true or null, or a constant expression like (+ 2 3) folded by MethodCompiler; the
+# Value is shared by every evaluation, and is never modified
+class ConstantNode(ExpressionNode):
+    def __init__(self, line_num, value):
+        super().__init__(line_num)
+        self.value = value
+
+    def evaluate(self, obj, frame):
+        return self.value
+
+
+# (operator operand1 operand2), e.g., (+ 5 6), (+ "abc" "def"), (> a 5), (== obj null)
+class BinaryOpNode(ExpressionNode):
+    def __init__(self, line_num, operator, operand1, operand2):
+        super().__init__(line_num)
+        self.operator = operator
+        self.operand1 = operand1
+        self.operand2 = operand2
+        self.site = BinaryOpSite(operator)  # shared with the other engines
+        # the operators, locals, fields and constants of an expression made of nothing else are evaluated together,
+        # unboxed, by the outermost operator (see compile_unboxed()); unboxed is None until it has been evaluated
+        # once, then the function doing that or False
+        self.is_pure = all(
+            isinstance(operand, (LocalNode, FieldNode, ConstantNode))
+            or (isinstance(operand, BinaryOpNode) and operand.is_pure)
+            for operand in (operand1, operand2)
+        )
+        self.unboxed = None if self.is_pure else False
+        if self.is_pure:
+            for operand in (operand1, operand2):
+                if isinstance(operand, BinaryOpNode):
+                    operand.unboxed = False
+
+    def evaluate(self, obj, frame):
+        unboxed = self.unboxed
+        if unboxed:
+            try:
+                return unboxed(obj, frame)
+            except GuardFailed:
+                pass
+        operand1 = self.operand1.evaluate(obj, frame)
+        operand2 = self.operand2.evaluate(obj, frame)
+        site = self.site
+        if operand1.t is site.fast_type and operand2.t is site.fast_type:
+            result = site.fast_op(operand1.v, operand2.v)
+        else:
+            result = self.evaluate_generic(obj, operand1, operand2)
+        if unboxed is None:
+            # every operator in the expression has now seen its operands once
+            self.unboxed = compile_unboxed(self)
+        return result
+
+    # applies the operator to two evaluated operands of any type, reporting errors; specializes the site when they're
+    # primitives of one type
+    def evaluate_generic(self, obj, operand1, operand2):
+        operator = self.operator
+        if operand1.t is operand2.t:
+            if operand1.t is ObjectDef.INT_TYPE_CONST:
+                return self.__apply(obj, InterpreterBase.INT_DEF, "ints", operand1, operand2)
+            if operand1.t is ObjectDef.STRING_TYPE_CONST:
+                return self.__apply(obj, InterpreterBase.STRING_DEF, "strings", operand1, operand2)
+            if operand1.t is ObjectDef.BOOL_TYPE_CONST:
+                return self.__apply(obj, InterpreterBase.BOOL_DEF, "bool", operand1, operand2)
+        # handle object reference comparisons last
+        if obj.interpreter.check_type_compatibility(operand1.type(), operand2.type(), False):
+            if operator not in obj.binary_ops[InterpreterBase.CLASS_DEF]:
+                obj.interpreter.error(
+                    ErrorType.TYPE_ERROR,
+                    f"operator {operator} applied to object references",
+                    self.line_num,
+                )
+            return obj.binary_ops[InterpreterBase.CLASS_DEF][operator](operand1, operand2)
+        # Either operand was an error, re-throw exception immediately
+        if operand1.t is ObjectDef.EXCEPTION_TYPE_CONST:
+            return operand1
+        if operand2.t is ObjectDef.EXCEPTION_TYPE_CONST:
+            return operand2
+        obj.interpreter.error(
+            ErrorType.TYPE_ERROR,
+            f"operator {operator} applied to two incompatible types",
+            self.line_num,
+        )
+
+    def __apply(self, obj, type_def, type_description, operand1, operand2):
+        if self.operator not in obj.binary_ops[type_def]:
+            obj.interpreter.error(
+                ErrorType.TYPE_ERROR,
+                "invalid operator applied to " + type_description,
+                self.line_num,
+            )
+        self.site.observe(operand1.t)
+        return obj.binary_ops[type_def][self.operator](operand1, operand2)
+
+
+# raised by the functions compile_unboxed() builds when a variable doesn't hold a Value of the type the operators
+# reading it were specialized to
+class GuardFailed(Exception):
+    pass
+
+
+class _NotUnboxable(Exception):
+    pass
+
+
+# returns a function of (obj, frame) that evaluates node, a BinaryOpNode whose operands are all operators, locals,
+# fields and constants, on the unboxed values of its variables and constants, boxing only the result; or False if
+# some operator in it isn't specialized to a primitive type (see BinaryOpSite), or the types don't agree. The
+# function is made of nested closures, one per operator and variable below node, which pass each other raw ints,
+# strings and bools; node's own closure applies the PRIMITIVE_BINARY_OPS function of its site, which boxes the
+# result. Each variable is checked to hold a Value of the type its operator was specialized to, and GuardFailed is
+# raised when one doesn't, for the caller to take the boxed path. Reading a variable or a constant has no side
+# effects, so doing that again there changes nothing.
+def compile_unboxed(node):
+    if node.site.fast_type is None:
+        return False
+    try:
+        return _compile_unboxed_operator(node.site.fast_op, node, node.site.fast_type)
+    except _NotUnboxable:
+        return False
+
+
+# returns a function of (obj, frame) applying function to the unboxed values of the operands of node, which must be
+# of operand_type; a local or constant operand is read by that function itself
+def _compile_unboxed_operator(function, node, operand_type):
+    if isinstance(node.operand2, ConstantNode):
+        constant2 = _unboxed_constant(node.operand2, operand_type)
+        if isinstance(node.operand1, LocalNode):
+            slot1 = node.operand1.slot
+
+            def local_op_constant(obj, frame):
+                value = frame[slot1]
+                if value.t is not operand_type:
+                    raise GuardFailed()
+                return function(value.v, constant2)
+
+            return local_op_constant
+        operand1 = _compile_unboxed_operand(node.operand1, operand_type)
+        return lambda obj, frame: function(operand1(obj, frame), constant2)
+    operand2 = _compile_unboxed_operand(node.operand2, operand_type)
+    if isinstance(node.operand1, ConstantNode):
+        constant1 = _unboxed_constant(node.operand1, operand_type)
+        return lambda obj, frame: function(constant1, operand2(obj, frame))
+    operand1 = _compile_unboxed_operand(node.operand1, operand_type)
+    return lambda obj, frame: function(operand1(obj, frame), operand2(obj, frame))
+
+
+# returns the unboxed value of a constant operand of operand_type
+def _unboxed_constant(operand, operand_type):
+    if operand.value.t is not operand_type:
+        raise _NotUnboxable()
+    return operand.value.v
+
+
+# returns a function of (obj, frame) evaluating operand to an unboxed value of operand_type
+def _compile_unboxed_operand(operand, operand_type):
+    if isinstance(operand, ConstantNode):
+        constant = _unboxed_constant(operand, operand_type)
+        return lambda obj, frame: constant
+
+    if isinstance(operand, LocalNode):
+        slot = operand.slot
+
+        def unboxed_local(obj, frame):
+            value = frame[slot]
+            if value.t is not operand_type:
+                raise GuardFailed()
+            return value.v
+
+        return unboxed_local
+
+    if isinstance(operand, FieldNode):
+        index = operand.field_index
+
+        def unboxed_field(obj, frame):
+            value = obj.slots[index]
+            if value.t is not operand_type:
+                raise GuardFailed()
+            return value.v
+
+        return unboxed_field
+
+    inner_type = operand.site.fast_type
+    if inner_type is None:
+        raise _NotUnboxable()
+    result_type = ObjectDef.BOOL_TYPE_CONST if operand.operator in BOOL_RESULT_OPERATORS else inner_type
+    if result_type is not operand_type:
+        raise _NotUnboxable()
+    return _compile_unboxed_operator(PYTHON_OPERATORS[operand.operator], operand, inner_type)
+
+
+# (! operand)
+class UnaryOpNode(ExpressionNode):
+    def __init__(self, line_num, operator, operand):
+        super().__init__(line_num)
+        self.operator = operator
+        self.operand = operand
+
+    def evaluate(self, obj, frame):
+        operand = self.operand.evaluate(obj, frame)
+        if operand.t is ObjectDef.BOOL_TYPE_CONST:
+            if self.operator not in obj.unary_ops[InterpreterBase.BOOL_DEF]:
+                obj.interpreter.error(
+                    ErrorType.TYPE_ERROR,
+                    "invalid unary operator applied to bool",
+                    self.line_num,
+                )
+            return obj.unary_ops[InterpreterBase.BOOL_DEF][self.operator](operand)
+        # re-throw exceptions immediately
+        if operand.t is ObjectDef.EXCEPTION_TYPE_CONST:
+            return operand
+        obj.interpreter.error(
+            ErrorType.TYPE_ERROR,
+            f"unary operator {self.operator} applied to non-bool",
+            self.line_num,
+        )
+
+
+# (call object_ref/me/super methodname p1 p2 p3)
+class CallNode(ExpressionNode):
+    # target is InterpreterBase.ME_DEF, InterpreterBase.SUPER_DEF or an ExpressionNode for the object reference;
+    # class_def is the class of the method making the call
+    def __init__(self, line_num, target, method_name, args, class_def):
+        super().__init__(line_num)
+        self.target = target
+        self.method_name = method_name
+        self.args = args
+        self.class_def = class_def
+        self.cache = CallSiteCache()  # shared by every engine that runs this call
+
+    def evaluate(self, obj, frame):
+        call = self.__find_call(obj, frame)
+        if type(call) is Value:
+            return call  # an exception
+        target_obj, method_def, actual_args = call
+        return target_obj.run_method(method_def, actual_args, self.line_num)
+
+    # like evaluate(), but instead of running the method returns a TailCall for a return statement with the given
+    # return type to run it with; an exception raised while evaluating the target or arguments is returned as is
+    def evaluate_tail_call(self, obj, frame, return_type):
+        call = self.__find_call(obj, frame)
+        if type(call) is Value:
+            return call
+        target_obj, method_def, actual_args = call
+        return TailCall(target_obj, method_def, actual_args, return_type, self.line_num)
+
+    # evaluates the target and arguments and finds the method to run; returns (target object, MethodDef, argument
+    # Values), or the exception Value raised while evaluating them
+    def __find_call(self, obj, frame):
+        # determine which object we want to call the method on, and which class we're calling it through
+        super_only = False
+        if self.target == InterpreterBase.ME_DEF:
+            target_obj = obj
+            visible_class = self.class_def
+        elif self.target == InterpreterBase.SUPER_DEF:
+            if self.class_def.get_superclass() is None:
+                obj.interpreter.error(
+                    ErrorType.TYPE_ERROR,
+                    "invalid call to super object by class " + self.class_def.get_name(),
+                    self.line_num,
+                )
+            target_obj = obj
+            visible_class = self.class_def.get_superclass()
+            super_only = True
+        else:
+            # return a Value() object which has a type and a value
+            obj_val = self.target.evaluate(obj, frame)
+            if obj_val.t is ObjectDef.EXCEPTION_TYPE_CONST:
+                return obj_val
+            if obj_val.is_null():
+                obj.interpreter.error(
+                    ErrorType.FAULT_ERROR, "null dereference", self.line_num
+                )
+            target_obj = obj_val.value()
+            visible_class = None
+        # prepare the actual arguments for passing
+        actual_args = []
+        for arg in self.args:
+            evaluated_value = arg.evaluate(obj, frame)
+
+            # Halt execution and immediately leave upon seeing error
+            if evaluated_value.t is ObjectDef.EXCEPTION_TYPE_CONST:
+                return evaluated_value
+
+            actual_args.append(evaluated_value)
+        method_def = self.cache.find_method(
+            target_obj, self.method_name, actual_args, super_only, self.line_num, visible_class
+        )
+        return target_obj, method_def, actual_args
+
+
+# (new classname)
+class NewNode(ExpressionNode):
+    def __init__(self, line_num, class_name):
+        super().__init__(line_num)
+        self.class_name = class_name
+        self.class_type = Type(class_name)
+        self.class_def = None  # set by get_class_def() the first time the expression runs
+
+    # returns the ClassDef to instantiate, which is looked up the first time (the class may be defined after the
+    # method containing the expression is compiled) and kept; the other engines share it through the node
+    def get_class_def(self, interpreter):
+        class_def = self.class_def
+        if class_def is None:
+            class_def = self.class_def = interpreter.get_class_def_to_instantiate(self.class_name, self.line_num)
+        return class_def
+
+    def evaluate(self, obj, frame):
+        interpreter = obj.interpreter
+        class_def = self.class_def or self.get_class_def(interpreter)
+        return Value(self.class_type, ObjectDef(interpreter, class_def, interpreter.trace_output))
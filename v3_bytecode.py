@@ -0,0 +1,842 @@
+"""
+Stack-based bytecode backend for the v3 interpreter, selected with Interpreter(engine=Interpreter.ENGINE_BYTECODE).
+
+BytecodeCompiler flattens the v3_ast tree that MethodCompiler built for a method into a CodeObject: a list of
+(opcode, argument) instructions for a small stack machine. Expressions push their Value onto the operand stack and
+statements consume them, so the operand stack is empty between statements. run_code() is the dispatch loop; it
+runs Brewin calls on an explicit call stack rather than by recursing in Python, so this engine supports recursion as
+deep as Interpreter.recursion_limit allows.
+
+Brewin exceptions are values of the exception type, exactly as in the tree-walker: they flow through expressions
+as ordinary values, and CHECK_EXCEPTION/THROW turn them into a jump to the innermost enclosing try handler of the
+method (or an exceptional return from it). Objects, dynamic dispatch and templates are shared with the other
+engines through ObjectDef and the interpreter.
+
+disassemble() renders a CodeObject as text; `python3 v3_bytecode.py program.brewin` disassembles every method.
+
+Performance: the VM is the engine for deep recursion. The tree-walkers run each Brewin call on Python's stack and
+stop a little short of 100000 calls deep, the default recursion_limit, with a FAULT_ERROR; the VM runs 100000 calls
+deep in about 0.8s and 300000 in about 2s, at under 300 bytes of heap per call (`python3 benchmark.py
+deep_recursion`). It is ahead on shallower recursion too: against the v3_ast tree-walker, 1.46x on
+v3/bench/recursion.brewin and 1.23x on fib.brewin, best of six `python3 benchmark.py engines` runs. Elsewhere in
+v3/bench it ranges from 1.33x (loop) to 0.83x (linked_list, which is mostly field reads and allocation).
+"""
+
+import sys
+
+from intbase import InterpreterBase, ErrorType
+from v3_ast import (
+    compile_unboxed,
+    GuardFailed,
+    TraceNode,
+    InvalidStatementNode,
+    BeginNode,
+    LetNode,
+    SetNode,
+    IfNode,
+    WhileNode,
+    ReturnNode,
+    PrintNode,
+    InputNode,
+    CallStatementNode,
+    TryNode,
+    ThrowNode,
+    InvalidExpressionNode,
+    LocalNode,
+    FieldNode,
+    MeNode,
+    UnresolvedNameNode,
+    ConstantNode,
+    BinaryOpNode,
+    UnaryOpNode,
+    CallNode,
+    NewNode,
+)
+from v3_env import create_frame, add_pending_return, check_pending_returns
+from v3_object import ObjectDef
+from v3_type_value import create_default_value
+from v3_type_value import NULL_TYPE, Value, bool_value, int_value, null_value
+
+
+class Opcode:
+    # expressions; each pushes one Value
+    LOAD_CONST = 0  # arg: Value
+    LOAD_LOCAL = 1  # arg: (frame slot, Type) of a parameter or local
+    LOAD_FIELD = 2  # arg: field slot index
+    LOAD_ME = 3
+    BINARY_OP = 4  # arg: (operator, line_num, BinaryOpSite); pops operand2 and operand1
+    # arg: (BinaryOpNode, target); evaluates the node unboxed (see compile_unboxed() in v3_ast.py) and jumps to the
+    # target, past the instructions evaluating it boxed, unless it isn't ready or a guard fails
+    UNBOXED_OP = 5
+    UNARY_OP = 6  # arg: (operator, line_num)
+    # arg: (method_name, argc, line_num, None, CallSiteCache); pops args and the target object Value, and checks the
+    # target itself when the compiler left out its CHECK_TARGET
+    CALL = 7
+    CALL_ME = 8  # arg: (method_name, argc, line_num, class of the calling method, CallSiteCache); pops args
+    CALL_SUPER = 9  # arg: (method_name, argc, line_num, superclass of the calling method, CallSiteCache); pops args
+    CHECK_TARGET = 10  # arg: (target, depth, line_num); null check, or skip the call like EXCEPTION_SKIP
+    EXCEPTION_SKIP = 11  # arg: (target, depth); if TOS is an exception, drop depth values under it and jump
+    NEW = 12  # arg: (class_name, Type, NewNode)
+    INPUT = 13  # arg: get_string; pushes the line read as a string or int Value
+    # statements
+    STORE_LOCAL = 14  # arg: (frame slot, Type, line_num)
+    STORE_FIELD = 15  # arg: (field slot index, line_num)
+    CHECK_EXCEPTION = 16  # arg: pop; if TOS is an exception, pop it and throw it, else pop it only if pop is true
+    JUMP = 17  # arg: target
+    JUMP_IF_FALSE = 18  # arg: (target, error_description, statement code, line_num); pops a bool condition
+    RETURN_VALUE = 19  # arg: (return_type, line_num)
+    RETURN_DEFAULT = 20  # arg: return_type
+    RETURN_NONE = 21
+    # arg: (method_name, argc, line_num, call class, CallSiteCache, CALL/CALL_ME/CALL_SUPER, return_type); pops like
+    # that call opcode, then runs the method in place of the running one (see TailCall in v3_env.py)
+    TAIL_CALL = 22
+    PRINT = 23  # arg: count
+    # arg: (((template class initializer or None, Type, initial Value, varname, frame slot, is_duplicate), ...),
+    # line_num)
+    LET_ENTER = 24
+    SETUP_TRY = 25  # arg: handler
+    POP_TRY = 26
+    CATCH = 27  # arg: frame slot; binds the exception on TOS to the exception variable
+    THROW = 28  # arg: line_num
+    RAISE_ERROR = 29  # arg: (error_type, description, line_num)
+    TRACE = 30  # arg: line to print
+
+
+OPCODE_NAMES = {
+    value: name for name, value in vars(Opcode).items() if not name.startswith("_")
+}
+
+INT_TYPE = ObjectDef.INT_TYPE_CONST
+STRING_TYPE = ObjectDef.STRING_TYPE_CONST
+BOOL_TYPE = ObjectDef.BOOL_TYPE_CONST
+EXCEPTION_TYPE = ObjectDef.EXCEPTION_TYPE_CONST
+
+
+# compiled form of one method
+class CodeObject:
+    def __init__(self, name, instructions, return_type):
+        self.name = name
+        self.instructions = instructions
+        self.return_type = return_type  # the method's declared return type, for falling off its end
+
+
+# stands in for the v3_ast tree as MethodDef.body, so ObjectDef.call_method can run it
+class BytecodeBody:
+    def __init__(self, code):
+        self.code = code
+
+    def execute(self, obj, frame):
+        return run_code(self.code, obj, frame)
+
+
+class BytecodeCompiler:
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.statement_compilers = {
+            TraceNode: self.__compile_trace,
+            InvalidStatementNode: self.__compile_invalid_statement,
+            BeginNode: self.__compile_begin,
+            LetNode: self.__compile_let,
+            SetNode: self.__compile_set,
+            IfNode: self.__compile_if,
+            WhileNode: self.__compile_while,
+            ReturnNode: self.__compile_return,
+            PrintNode: self.__compile_print,
+            InputNode: self.__compile_input,
+            CallStatementNode: self.__compile_call_statement,
+            TryNode: self.__compile_try,
+            ThrowNode: self.__compile_throw,
+        }
+        self.expression_compilers = {
+            InvalidExpressionNode: self.__compile_invalid_expression,
+            LocalNode: self.__compile_local,
+            FieldNode: self.__compile_field,
+            MeNode: self.__compile_me,
+            UnresolvedNameNode: self.__compile_unresolved_name,
+            ConstantNode: self.__compile_constant,
+            BinaryOpNode: self.__compile_binary_op,
+            UnaryOpNode: self.__compile_unary_op,
+            CallNode: self.__compile_call,
+            NewNode: self.__compile_new,
+        }
+
+    # replaces the v3_ast tree in method_def.body with its bytecode equivalent
+    def compile_method(self, method_def):
+        self.instructions = []
+        self.compile_statement(method_def.body)
+        self.__emit(Opcode.RETURN_NONE)
+        method_def.body = BytecodeBody(
+            CodeObject(method_def.method_name, self.instructions, method_def.return_type)
+        )
+
+    def compile_statement(self, node):
+        self.statement_compilers[type(node)](node)
+
+    def compile_expression(self, node):
+        self.expression_compilers[type(node)](node)
+
+    # appends an instruction and returns its index, so jumps can be patched once their target is known
+    def __emit(self, opcode, arg=None):
+        self.instructions.append((opcode, arg))
+        return len(self.instructions) - 1
+
+    def __here(self):
+        return len(self.instructions)
+
+    def __patch(self, index, arg):
+        self.instructions[index] = (self.instructions[index][0], arg)
+
+    def __compile_trace(self, node):
+        self.__emit(Opcode.TRACE, f"{node.line_num}: {node.code}")
+        self.compile_statement(node.statement)
+
+    def __compile_invalid_statement(self, node):
+        self.__emit(Opcode.RAISE_ERROR, (node.error_type, node.description, node.line_num))
+
+    def __compile_begin(self, node):
+        for statement in node.statements:
+            self.compile_statement(statement)
+
+    def __compile_let(self, node):
+        self.__emit(Opcode.LET_ENTER, (tuple(node.local_defs), node.line_num))
+        self.__compile_begin(node)
+
+    def __compile_set(self, node):
+        self.__compile_checked(node.expression)
+        self.__compile_store(node.target)
+
+    def __compile_if(self, node):
+        self.__compile_checked(node.condition)
+        jump_if_false = self.__emit(Opcode.JUMP_IF_FALSE)
+        self.compile_statement(node.then_statement)
+        description = "non-boolean if condition "
+        if node.else_statement is None:
+            self.__patch(jump_if_false, (self.__here(), description, node.code, node.line_num))
+            return
+        jump_to_end = self.__emit(Opcode.JUMP)
+        self.__patch(jump_if_false, (self.__here(), description, node.code, node.line_num))
+        self.compile_statement(node.else_statement)
+        self.__patch(jump_to_end, self.__here())
+
+    def __compile_while(self, node):
+        loop_start = self.__here()
+        self.__compile_checked(node.condition)
+        jump_if_false = self.__emit(Opcode.JUMP_IF_FALSE)
+        self.compile_statement(node.body)
+        self.__emit(Opcode.JUMP, loop_start)
+        self.__patch(
+            jump_if_false, (self.__here(), "non-boolean while condition ", node.code, node.line_num)
+        )
+
+    def __compile_return(self, node):
+        if node.expression is None:
+            self.__emit(Opcode.RETURN_DEFAULT, node.return_type)
+            return
+        if node.is_tail_call:
+            # TAIL_CALL never falls through; the exception of a target or argument skips to the end of the call
+            self.__compile_call(node.expression, node.return_type)
+            self.__emit(Opcode.CHECK_EXCEPTION)
+        else:
+            self.__compile_checked(node.expression)
+        self.__emit(Opcode.RETURN_VALUE, (node.return_type, node.line_num))
+
+    def __compile_print(self, node):
+        for expression in node.expressions:
+            self.__compile_checked(expression)
+        self.__emit(Opcode.PRINT, len(node.expressions))
+
+    def __compile_input(self, node):
+        self.__emit(Opcode.INPUT, node.get_string)
+        self.__compile_store(node.target)
+
+    # compiles an expression and throws the exception it evaluates to, if it can evaluate to one
+    def __compile_checked(self, node):
+        self.compile_expression(node)
+        if _may_be_exception(node):
+            self.__emit(Opcode.CHECK_EXCEPTION)
+
+    # pops the Value on top of the stack into the target of a set or input statement
+    def __compile_store(self, target):
+        if isinstance(target, LocalNode):
+            self.__emit(Opcode.STORE_LOCAL, (target.slot, target.var_type, target.line_num))
+        elif isinstance(target, FieldNode):
+            self.__emit(Opcode.STORE_FIELD, (target.field_index, target.line_num))
+        else:
+            description = "unknown field/variable " + target.name
+            self.__emit(Opcode.RAISE_ERROR, (ErrorType.NAME_ERROR, description, target.line_num))
+
+    def __compile_call_statement(self, node):
+        self.compile_expression(node.call)
+        self.__emit(Opcode.CHECK_EXCEPTION, True)
+
+    def __compile_try(self, node):
+        setup_try = self.__emit(Opcode.SETUP_TRY)
+        self.compile_statement(node.try_statement)
+        self.__emit(Opcode.POP_TRY)
+        jump_to_end = self.__emit(Opcode.JUMP)
+        self.__patch(setup_try, self.__here())
+        if node.catch_statement is None:
+            self.__emit(
+                Opcode.RAISE_ERROR,
+                (ErrorType.SYNTAX_ERROR, "try statement must have two statements", node.line_num),
+            )
+        else:
+            self.__emit(Opcode.CATCH, node.exception_slot)
+            self.compile_statement(node.catch_statement)
+        self.__patch(jump_to_end, self.__here())
+
+    def __compile_throw(self, node):
+        if node.expression is None:
+            self.__emit(
+                Opcode.RAISE_ERROR,
+                (
+                    ErrorType.SYNTAX_ERROR,
+                    "throw statement must have an expression next to it",
+                    node.line_num,
+                ),
+            )
+            return
+        self.compile_expression(node.expression)
+        self.__emit(Opcode.THROW, node.line_num)
+
+    def __compile_invalid_expression(self, node):
+        self.__emit(Opcode.RAISE_ERROR, (ErrorType.SYNTAX_ERROR, node.description, node.line_num))
+
+    def __compile_local(self, node):
+        self.__emit(Opcode.LOAD_LOCAL, (node.slot, node.var_type))
+
+    def __compile_field(self, node):
+        self.__emit(Opcode.LOAD_FIELD, node.field_index)
+
+    def __compile_me(self, node):
+        self.__emit(Opcode.LOAD_ME)
+
+    def __compile_unresolved_name(self, node):
+        description = "invalid field or parameter " + node.name
+        self.__emit(Opcode.RAISE_ERROR, (ErrorType.NAME_ERROR, description, node.line_num))
+
+    def __compile_constant(self, node):
+        self.__emit(Opcode.LOAD_CONST, node.value)
+
+    def __compile_binary_op(self, node):
+        unboxed_op = None
+        if node.unboxed is None:
+            unboxed_op = self.__emit(Opcode.UNBOXED_OP)
+        self.compile_expression(node.operand1)
+        self.compile_expression(node.operand2)
+        self.__emit(Opcode.BINARY_OP, (node.operator, node.line_num, node.site))
+        if unboxed_op is not None:
+            self.__patch(unboxed_op, (node, self.__here()))
+
+    def __compile_unary_op(self, node):
+        self.compile_expression(node.operand)
+        self.__emit(Opcode.UNARY_OP, (node.operator, node.line_num))
+
+    # an exception raised while evaluating the target or an argument becomes the value of the whole call
+    # expression, so each of them is followed by a conditional skip to the end of the call. tail_return_type is given
+    # to compile the call of a tail call return statement as a TAIL_CALL
+    def __compile_call(self, node, tail_return_type=None):
+        skips = []
+        call_class = None
+        if node.target == InterpreterBase.ME_DEF:
+            call_opcode, depth = Opcode.CALL_ME, 0
+            call_class = node.class_def
+        elif node.target == InterpreterBase.SUPER_DEF:
+            call_opcode, depth = Opcode.CALL_SUPER, 0
+            call_class = node.class_def.get_superclass()
+            if call_class is None:
+                description = "invalid call to super object by class " + node.class_def.get_name()
+                self.__emit(Opcode.RAISE_ERROR, (ErrorType.TYPE_ERROR, description, node.line_num))
+        else:
+            call_opcode, depth = Opcode.CALL, 1
+            self.compile_expression(node.target)
+            if tail_return_type is not None or not all(_is_plain_read(arg) for arg in node.args):
+                skips.append(self.__emit(Opcode.CHECK_TARGET))
+        for arg in node.args:
+            self.compile_expression(arg)
+            if _may_be_exception(arg):
+                skips.append(self.__emit(Opcode.EXCEPTION_SKIP))
+            else:
+                # the values under the exception of a later argument include this one
+                skips.append(None)
+        call_arg = (node.method_name, len(node.args), node.line_num, call_class, node.cache)
+        if tail_return_type is None:
+            self.__emit(call_opcode, call_arg)
+        else:
+            self.__emit(Opcode.TAIL_CALL, call_arg + (call_opcode, tail_return_type))
+        end = self.__here()
+        for skip in skips:
+            if skip is None:
+                depth += 1
+            elif self.instructions[skip][0] == Opcode.CHECK_TARGET:
+                self.__patch(skip, (end, 0, node.line_num))
+            else:
+                self.__patch(skip, (end, depth))
+                depth += 1
+
+    def __compile_new(self, node):
+        self.__emit(Opcode.NEW, (node.class_name, node.class_type, node))
+
+
+# whether an expression can evaluate to an exception. Locals, parameters and fields never hold one: set, let and
+# catch only store other Values, and an exception argument skips its call. So only calls, and operators applied to
+# them, need the CHECK_EXCEPTION or EXCEPTION_SKIP that follows an expression
+def _may_be_exception(node):
+    if isinstance(node, (ConstantNode, LocalNode, FieldNode, MeNode, NewNode)):
+        return False
+    if isinstance(node, BinaryOpNode):
+        return _may_be_exception(node.operand1) or _may_be_exception(node.operand2)
+    if isinstance(node, UnaryOpNode):
+        return _may_be_exception(node.operand)
+    return True
+
+
+# whether an expression only reads a local, a field or a constant: it can't fail or print anything, so a CALL may check
+# its target after evaluating arguments like it, rather than before them
+def _is_plain_read(node):
+    return isinstance(node, (ConstantNode, LocalNode, FieldNode, MeNode))
+
+
+# runs a CodeObject for obj with the given frame (see v3_env.py); returns None or the Value the method is leaving
+# with, like the v3_ast nodes. Brewin calls made while it runs don't recurse in Python: the caller's state is saved on
+# call_stack and the callee runs in this same loop, sharing the operand stack and the list of active try statements
+# with its callers. So the depth of Brewin recursion is limited only by interpreter.recursion_limit, and each level
+# costs one saved tuple plus the callee's frame. A tail call saves nothing: the callee replaces the running method,
+# leaving only its return type check in pending (see add_pending_return() in v3_env.py).
+def run_code(code, obj, frame):
+    instructions = code.instructions
+    interpreter = obj.interpreter
+    # the method calls that may be made from here; the ones already active include this one
+    recursion_limit = interpreter.recursion_limit - interpreter.call_depth
+    # the memoized type check; obj.check_type_compatibility() reports the types it finds incompatible
+    compatible = interpreter.type_manager.check_type_compatibility
+    stack = []
+    push = stack.append
+    pop = stack.pop
+    try_blocks = []  # (handler, stack depth, call depth) for each active try statement, innermost last
+    call_stack = []  # (code, instructions, pc, obj, frame, base, pending) for each caller of the running method
+    depth = 0  # len(call_stack)
+    base = 0  # depth of the operand stack when the running method was called
+    pending = None  # return type checks of the tail calls the running method replaced
+    pc = 0
+    # the opcodes as locals, tested below roughly in the order of how often the benchmark programs run them
+    UNBOXED_OP, STORE_LOCAL, JUMP_IF_FALSE, LOAD_LOCAL, JUMP = (
+        Opcode.UNBOXED_OP, Opcode.STORE_LOCAL, Opcode.JUMP_IF_FALSE, Opcode.LOAD_LOCAL, Opcode.JUMP
+    )
+    STORE_FIELD, RETURN_VALUE, CHECK_EXCEPTION, NEW, LOAD_CONST, CHECK_TARGET = (
+        Opcode.STORE_FIELD, Opcode.RETURN_VALUE, Opcode.CHECK_EXCEPTION, Opcode.NEW, Opcode.LOAD_CONST,
+        Opcode.CHECK_TARGET,
+    )
+    CALL, CALL_ME, CALL_SUPER, BINARY_OP, LOAD_FIELD, EXCEPTION_SKIP = (
+        Opcode.CALL, Opcode.CALL_ME, Opcode.CALL_SUPER, Opcode.BINARY_OP, Opcode.LOAD_FIELD, Opcode.EXCEPTION_SKIP
+    )
+    while True:
+        opcode, arg = instructions[pc]
+        pc += 1
+
+        if opcode == UNBOXED_OP:
+            node = arg[0]
+            unboxed = node.unboxed
+            if unboxed is None and node.site.fast_type is not None:
+                # the boxed instructions have run once, and specialized the operators they could
+                unboxed = node.unboxed = compile_unboxed(node)
+            if unboxed:
+                try:
+                    push(unboxed(obj, frame))
+                    pc = arg[1]
+                except GuardFailed:
+                    pass
+
+        elif opcode == STORE_LOCAL:
+            value = pop()
+            if not compatible(arg[1], value.t, True):
+                obj.check_type_compatibility(arg[1], value.t, True, arg[2])
+            frame[arg[0]] = value
+
+        elif opcode == JUMP_IF_FALSE:
+            condition = pop()
+            if condition.t is not BOOL_TYPE:
+                target, description, statement_code, line_num = arg
+                interpreter.error(
+                    ErrorType.TYPE_ERROR,
+                    description + " ".join(x for x in statement_code[1]),
+                    line_num,
+                )
+            if not condition.v:
+                pc = arg[0]
+
+        elif opcode == LOAD_LOCAL:
+            value = frame[arg[0]]
+            if value.v is None and value.is_null():
+                value = null_value(arg[1])
+            push(value)
+
+        elif opcode == JUMP:
+            pc = arg
+
+        elif opcode == STORE_FIELD:
+            value = pop()
+            field_type = obj.layout.field_types[arg[0]]
+            if not compatible(field_type, value.t, True):
+                obj.check_type_compatibility(field_type, value.t, True, arg[1])
+            obj.slots[arg[0]] = value
+
+        elif opcode == RETURN_VALUE:
+            result = pop()
+            return_type, line_num = arg
+            if result.t is NULL_TYPE:
+                obj.check_type_compatibility(return_type, result.t, True, line_num)
+                result = null_value(return_type)  # propagate return type to null
+            if not compatible(return_type, result.t, True):
+                obj.check_type_compatibility(return_type, result.t, True, line_num)
+            if pending is not None:
+                result = check_pending_returns(obj, result, pending)
+            if not depth:
+                return result
+            if try_blocks:
+                code, instructions, pc, obj, frame, base, pending = _leave_method(
+                    call_stack, stack, try_blocks, depth, base
+                )
+            else:
+                del stack[base:]
+                code, instructions, pc, obj, frame, base, pending = call_stack.pop()
+            depth -= 1
+            push(result)
+
+        elif opcode == CALL or opcode == CALL_ME or opcode == CALL_SUPER:
+            method_name, argc, line_num, call_class, cache = arg
+            args = stack[len(stack) - argc :]
+            del stack[len(stack) - argc :]
+            if opcode == CALL:
+                target = pop()
+                if target.t is EXCEPTION_TYPE:
+                    push(target)  # like CHECK_TARGET: the exception is the value of the call
+                    continue
+                if target.v is None and target.is_null():
+                    interpreter.error(ErrorType.FAULT_ERROR, "null dereference", line_num)
+                target = target.v
+            else:
+                target = obj
+            method_def = cache.find_method(
+                target, method_name, args, opcode == CALL_SUPER, line_num, call_class
+            )
+            if depth + 1 > recursion_limit:
+                interpreter.error(ErrorType.FAULT_ERROR, "maximum recursion depth exceeded", line_num)
+            # run the method in this loop, like ObjectDef.run_method() would
+            call_stack.append((code, instructions, pc, obj, frame, base, pending))
+            depth += 1
+            base = len(stack)
+            pending = None
+            code = method_def.body.code
+            instructions = code.instructions
+            obj = target
+            frame = create_frame(method_def, args)
+            pc = 0
+
+        elif opcode == CHECK_EXCEPTION:
+            if stack[-1].t is EXCEPTION_TYPE:
+                result = pop()
+                if try_blocks and try_blocks[-1][2] == depth:
+                    pc = _unwind(stack, try_blocks, result)
+                    continue
+                # the exception leaves the method
+                if not depth:
+                    return result
+                code, instructions, pc, obj, frame, base, pending = _leave_method(call_stack, stack, try_blocks, depth, base)
+                depth -= 1
+                push(result)
+            elif arg:
+                pop()  # the value of a call statement
+
+        elif opcode == NEW:
+            class_name, class_type, node = arg
+            class_def = node.class_def or node.get_class_def(interpreter)
+            push(Value(class_type, ObjectDef(interpreter, class_def, interpreter.trace_output)))
+
+        elif opcode == LOAD_CONST:
+            push(arg)
+
+        elif opcode == CHECK_TARGET:
+            target = stack[-1]
+            if target.t is EXCEPTION_TYPE:
+                pc = arg[0]
+            elif target.is_null():
+                interpreter.error(ErrorType.FAULT_ERROR, "null dereference", arg[2])
+
+        elif opcode == BINARY_OP:
+            operand2 = pop()
+            operand1 = pop()
+            site = arg[2]
+            if operand1.t is site.fast_type and operand2.t is site.fast_type:
+                push(site.fast_op(operand1.v, operand2.v))
+            else:
+                push(_binary_op(obj, arg[0], operand1, operand2, arg[1], site))
+
+        elif opcode == LOAD_FIELD:
+            value = obj.slots[arg]
+            if value.v is None and value.is_null():
+                value = null_value(obj.layout.field_types[arg])
+            push(value)
+
+        elif opcode == EXCEPTION_SKIP:
+            if stack[-1].t is EXCEPTION_TYPE:
+                pc = _skip_call(stack, arg)
+
+        elif opcode == Opcode.LET_ENTER:
+            local_defs, line_num = arg
+            for template_initializer, var_type, initial_value, var_name, slot, is_duplicate in local_defs:
+                # Handle templated class types that weren't built when the program was loaded
+                if template_initializer is not None:
+                    interpreter.create_class_def_from_template(template_initializer, line_num)
+                if initial_value is None:
+                    interpreter.error(
+                        ErrorType.SYNTAX_ERROR,
+                        "initial value of local variable " + var_name + " must be a constant",
+                        line_num,
+                    )
+                obj.check_type_compatibility(var_type, initial_value.type(), True, line_num)
+                if is_duplicate:
+                    interpreter.error(
+                        ErrorType.NAME_ERROR,
+                        "duplicate local variable name " + var_name,
+                        line_num,
+                    )
+                frame[slot] = initial_value
+
+        elif opcode == Opcode.RETURN_NONE or opcode == Opcode.RETURN_DEFAULT:
+            if not depth and pending is None:
+                return None if opcode == Opcode.RETURN_NONE else create_default_value(arg)
+            # a method without a return value gives its caller the default value of its return type
+            result = create_default_value(code.return_type)
+            if pending is not None:
+                result = check_pending_returns(obj, result, pending)
+            if not depth:
+                return result
+            if try_blocks:
+                code, instructions, pc, obj, frame, base, pending = _leave_method(
+                    call_stack, stack, try_blocks, depth, base
+                )
+            else:
+                del stack[base:]
+                code, instructions, pc, obj, frame, base, pending = call_stack.pop()
+            depth -= 1
+            push(result)
+
+        elif opcode == Opcode.TAIL_CALL:
+            method_name, argc, line_num, call_class, cache, call_opcode, return_type = arg
+            args = stack[len(stack) - argc :]
+            del stack[len(stack) - argc :]
+            target = obj if call_opcode != CALL else pop().v
+            method_def = cache.find_method(
+                target, method_name, args, call_opcode == CALL_SUPER, line_num, call_class
+            )
+            if obj.trace_output:
+                print(f"{line_num}: tail call to {method_name} replaces the frame of {code.name}")
+            pending = add_pending_return(pending, return_type, line_num)
+            # a tail call is never inside a try part, so the running method has no try statements left to drop
+            code = method_def.body.code
+            instructions = code.instructions
+            obj = target
+            frame = create_frame(method_def, args)
+            pc = 0
+
+        elif opcode == Opcode.LOAD_ME:
+            push(obj.get_me_as_value())
+
+        elif opcode == Opcode.UNARY_OP:
+            operand = pop()
+            if operand.t is BOOL_TYPE:
+                push(bool_value(not operand.v))
+            elif operand.t is EXCEPTION_TYPE:
+                push(operand)
+            else:
+                interpreter.error(
+                    ErrorType.TYPE_ERROR,
+                    f"unary operator {arg[0]} applied to non-bool",
+                    arg[1],
+                )
+
+        elif opcode == Opcode.PRINT:
+            output = ""
+            for term in stack[len(stack) - arg :]:
+                val = term.v
+                if term.t is BOOL_TYPE:
+                    val = "true" if val == True else "false"
+                output += str(val)
+            del stack[len(stack) - arg :]
+            interpreter.output(output)
+
+        elif opcode == Opcode.INPUT:
+            inp = interpreter.get_input()
+            if arg:
+                push(Value(STRING_TYPE, inp))
+            else:
+                push(int_value(int(inp)))
+
+        elif opcode == Opcode.SETUP_TRY:
+            try_blocks.append((arg, len(stack), depth))
+
+        elif opcode == Opcode.POP_TRY:
+            try_blocks.pop()
+
+        elif opcode == Opcode.CATCH:
+            frame[arg] = Value(STRING_TYPE, pop().v)
+
+        elif opcode == Opcode.THROW:
+            val = pop()
+            if val.t is not STRING_TYPE:
+                interpreter.error(
+                    ErrorType.TYPE_ERROR, "throw statement must throw a string", arg
+                )
+            result = Value(EXCEPTION_TYPE, val.v)
+            if try_blocks and try_blocks[-1][2] == depth:
+                pc = _unwind(stack, try_blocks, result)
+                continue
+            # the exception leaves the method
+            if not depth:
+                return result
+            code, instructions, pc, obj, frame, base, pending = _leave_method(call_stack, stack, try_blocks, depth, base)
+            depth -= 1
+            push(result)
+
+        elif opcode == Opcode.RAISE_ERROR:
+            interpreter.error(*arg)
+
+        elif opcode == Opcode.TRACE:
+            print(arg)
+
+        else:
+            raise ValueError(f"Unknown opcode {opcode} at {code.name}:{pc - 1}")
+
+
+# transfers control to the innermost try handler, restoring the operand stack to the state it was in when its try
+# statement started; returns the handler's address. Locals need no restoring: each block's slots are assigned when it
+# starts, and names that went out of scope were resolved away by MethodCompiler
+def _unwind(stack, try_blocks, exception):
+    handler, stack_depth, _ = try_blocks.pop()
+    del stack[stack_depth:]
+    stack.append(exception)
+    return handler
+
+
+# drops what the method running at call depth depth left on the operand stack, and any try statements it returned
+# from inside of; returns the state of its caller
+def _leave_method(call_stack, stack, try_blocks, depth, base):
+    while try_blocks and try_blocks[-1][2] == depth:
+        try_blocks.pop()
+    del stack[base:]
+    return call_stack.pop()
+
+
+# the exception on top of the stack replaces the partially evaluated call below it; returns the end of the call
+def _skip_call(stack, arg):
+    target, depth = arg
+    if depth:
+        exception = stack.pop()
+        del stack[len(stack) - depth :]
+        stack.append(exception)
+    return target
+
+
+# the generic path of BINARY_OP, for operands that fail the guard of its site
+def _binary_op(obj, operator, operand1, operand2, line_num, site):
+    type1 = operand1.t
+    if type1 is operand2.t:
+        if type1 is INT_TYPE:
+            return _apply_binary_op(obj, InterpreterBase.INT_DEF, "ints", operator, operand1, operand2, line_num, site)
+        if type1 is STRING_TYPE:
+            return _apply_binary_op(
+                obj, InterpreterBase.STRING_DEF, "strings", operator, operand1, operand2, line_num, site
+            )
+        if type1 is BOOL_TYPE:
+            return _apply_binary_op(obj, InterpreterBase.BOOL_DEF, "bool", operator, operand1, operand2, line_num, site)
+    # handle object reference comparisons last
+    if obj.interpreter.check_type_compatibility(type1, operand2.t, False):
+        if operator not in obj.binary_ops[InterpreterBase.CLASS_DEF]:
+            obj.interpreter.error(
+                ErrorType.TYPE_ERROR,
+                f"operator {operator} applied to object references",
+                line_num,
+            )
+        return obj.binary_ops[InterpreterBase.CLASS_DEF][operator](operand1, operand2)
+    # Either operand was an error, re-throw exception immediately
+    if type1 is EXCEPTION_TYPE:
+        return operand1
+    if operand2.t is EXCEPTION_TYPE:
+        return operand2
+    obj.interpreter.error(
+        ErrorType.TYPE_ERROR,
+        f"operator {operator} applied to two incompatible types",
+        line_num,
+    )
+
+
+def _apply_binary_op(obj, type_def, type_description, operator, operand1, operand2, line_num, site):
+    ops = obj.binary_ops[type_def]
+    if operator not in ops:
+        obj.interpreter.error(
+            ErrorType.TYPE_ERROR,
+            "invalid operator applied to " + type_description,
+            line_num,
+        )
+    site.observe(operand1.t)
+    return ops[operator](operand1, operand2)
+
+
+# renders a CodeObject as one line per instruction: address, opcode name and argument
+def disassemble(code):
+    lines = [f"method {code.name}:"]
+    for pc, (opcode, arg) in enumerate(code.instructions):
+        line = f"  {pc:>4}  {OPCODE_NAMES[opcode]:<16}"
+        if arg is not None:
+            line += _format_arg(opcode, arg)
+        lines.append(line.rstrip())
+    return "\n".join(lines)
+
+
+def _format_arg(opcode, arg):
+    if opcode == Opcode.LOAD_CONST:
+        return f"{arg.t.type_name} {arg.v!r}"
+    if opcode == Opcode.JUMP_IF_FALSE:
+        return f"-> {arg[0]}"
+    if opcode == Opcode.JUMP or opcode == Opcode.SETUP_TRY:
+        return f"-> {arg}"
+    if opcode == Opcode.EXCEPTION_SKIP or opcode == Opcode.CHECK_TARGET:
+        return f"-> {arg[0]}"
+    if opcode in (Opcode.BINARY_OP, Opcode.UNARY_OP, Opcode.NEW):
+        return str(arg[0])
+    if opcode == Opcode.UNBOXED_OP:
+        return f"{arg[0].operator} -> {arg[1]}"
+    if opcode == Opcode.LOAD_LOCAL or opcode == Opcode.STORE_LOCAL or opcode == Opcode.STORE_FIELD:
+        return f"slot {arg[0]}"
+    if opcode == Opcode.LOAD_FIELD or opcode == Opcode.CATCH:
+        return f"slot {arg}"
+    if opcode in (Opcode.CALL, Opcode.CALL_ME, Opcode.CALL_SUPER, Opcode.TAIL_CALL):
+        return f"{arg[0]} ({arg[1]} args)"
+    if opcode == Opcode.LET_ENTER:
+        return " ".join(f"{local_def[1].type_name} {local_def[3]}@{local_def[4]}" for local_def in arg[0])
+    if opcode == Opcode.RETURN_VALUE:
+        return arg[0].type_name
+    if opcode == Opcode.RETURN_DEFAULT:
+        return arg.type_name
+    if opcode == Opcode.CHECK_EXCEPTION:
+        return "pop" if arg else ""
+    if opcode == Opcode.RAISE_ERROR:
+        return f"{arg[0]} {arg[1]}"
+    return str(arg)
+
+
+# CODE FOR DEBUGGING PURPOSES ONLY: prints the bytecode of every method in a program
+if __name__ == "__main__":
+    from interpreterv3 import Interpreter
+
+    interpreter = Interpreter(engine=Interpreter.ENGINE_BYTECODE)
+    with open(sys.argv[1], encoding="utf-8") as handle:
+        interpreter.load(handle)
+    for class_def in interpreter.class_index.values():
+        if class_def.is_template_class:
+            continue
+        print(f"class {class_def.get_name()}")
+        for method_def in class_def.get_methods():
+            print(disassemble(method_def.body.code))
+        print()
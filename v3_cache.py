@@ -0,0 +1,119 @@
+"""
+Content-addressed cache of parsed programs, for running the same Brewin source many times:
+Interpreter(program_cache=ProgramCache()) looks each program up by a hash of its source before parsing it.
+
+Only parse trees are cached, so a hit saves the parse and nothing else (about a quarter of the time it takes to load
+the v3 test programs; see `benchmark.py program_cache`). Parse trees don't depend on the interpreter, its engine or
+its options, and loading a program doesn't change them. Every Interpreter that runs a program still checks and
+builds its own ClassDefs, compiled methods, call site caches and template classes from the shared tree, since the
+compiled code holds state of the run (its call site caches, for one); so
+nothing one run changes carries over to the next, and a cached program doesn't keep any Interpreter alive. The most
+recently used max_entries parse trees are kept in memory.
+
+With a directory, the cache also pickles each parse tree there, which saves the parse when a program isn't in
+memory, e.g. in a new process. Only point it at a directory nobody else can write to: loading a pickle can run code.
+"""
+
+import collections
+import hashlib
+import os
+import pickle
+import tempfile
+
+
+# returns program, which may be any iterable of lines (see BParser.parse_stream), as a list of lines, and a hex
+# digest of them; lines are hashed with their lengths, so programs only share a digest if they're split into the same
+# lines (and get the same line numbers)
+def source_digest(program):
+    if isinstance(program, str):
+        program = program.splitlines()
+    lines = list(program)
+    digest = hashlib.sha256()
+    for line in lines:
+        encoded = line.encode("utf-8", "surrogatepass")
+        digest.update(len(encoded).to_bytes(8, "little"))
+        digest.update(encoded)
+    return lines, digest.hexdigest()
+
+
+class ProgramCache:
+    DEFAULT_MAX_ENTRIES = 64
+
+    # directory, if given, is where parse trees are pickled; it's created if it doesn't exist
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, directory=None):
+        self.max_entries = max_entries
+        self.directory = directory
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        self.programs = collections.OrderedDict()  # digest -> parse tree, least recently used first
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.disk_misses = 0
+
+    # returns the parse tree stored for the source with the given digest (see source_digest), from memory or else
+    # from the directory, or None
+    def get(self, digest):
+        parsed_program = self.programs.get(digest)
+        if parsed_program is not None:
+            self.hits += 1
+            self.programs.move_to_end(digest)
+            return parsed_program
+        self.misses += 1
+        parsed_program = self.__read(digest)
+        if parsed_program is not None:
+            self.__remember(digest, parsed_program)
+        return parsed_program
+
+    # stores the parse tree of the source with the given digest, in memory and in the directory if there is one
+    def put(self, digest, parsed_program):
+        self.__remember(digest, parsed_program)
+        self.__write(digest, parsed_program)
+
+    # returns the hit and miss counts of the in-memory cache and of the directory of parse trees
+    def get_stats(self):
+        return {
+            "entries": len(self.programs),
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "disk_misses": self.disk_misses,
+        }
+
+    def __remember(self, digest, parsed_program):
+        self.programs[digest] = parsed_program
+        self.programs.move_to_end(digest)
+        if len(self.programs) > self.max_entries:
+            self.programs.popitem(last=False)
+
+    # returns the parse tree pickled for the source with the given digest, or None if there's no directory or it
+    # isn't there (or can't be read: a truncated, corrupt or stale pickle can fail to load with almost any exception,
+    # and is a miss like any other)
+    def __read(self, digest):
+        if self.directory is None:
+            return None
+        try:
+            with open(self.__path(digest), "rb") as handle:
+                parsed_program = pickle.load(handle)
+        except Exception:  # pylint: disable=broad-except
+            self.disk_misses += 1
+            return None
+        self.disk_hits += 1
+        return parsed_program
+
+    # pickles parsed_program, if there's a directory; the file is written under a temporary name and then renamed,
+    # so other processes sharing the directory never read a partial one
+    def __write(self, digest, parsed_program):
+        if self.directory is None:
+            return
+        handle = tempfile.NamedTemporaryFile(dir=self.directory, suffix=".tmp", delete=False)
+        try:
+            with handle:
+                pickle.dump(parsed_program, handle, pickle.HIGHEST_PROTOCOL)
+            os.replace(handle.name, self.__path(digest))
+        except BaseException:
+            os.unlink(handle.name)
+            raise
+
+    def __path(self, digest):
+        return os.path.join(self.directory, digest + ".pickle")
@@ -0,0 +1,34 @@
+"""
+Inline caches for method calls. Every (call ...) expression gets its own CallSiteCache, which remembers the
+MethodDef that ObjectDef.find_method() picked for each combination of receiver class and argument types seen at
+that call site, so calls in a loop skip the vtable search and the parameter type checks after the first time.
+"""
+
+
+class CallSiteCache:
+    # a call site that has seen more than this many receiver class/argument type combinations stops adding entries
+    MAX_ENTRIES = 8
+
+    def __init__(self):
+        self.entries = {}
+        self.version = None  # TypeManager.version the entries were computed under
+        self.hits = 0
+        self.misses = 0
+
+    # returns the MethodDef to run for a call on obj, like ObjectDef.find_method()
+    def find_method(self, obj, method_name, actual_params, super_only, line_num, visible_class=None):
+        type_manager = obj.interpreter.type_manager
+        if self.version != type_manager.version:
+            # a new class type can make a parameter type valid, and with it an overload compatible
+            self.entries.clear()
+            self.version = type_manager.version
+        key = (obj.class_def, tuple(actual.t for actual in actual_params))
+        method_def = self.entries.get(key)
+        if method_def is not None:
+            self.hits += 1
+            return method_def
+        self.misses += 1
+        method_def = obj.find_method(method_name, actual_params, super_only, line_num, visible_class)
+        if len(self.entries) < CallSiteCache.MAX_ENTRIES:
+            self.entries[key] = method_def
+        return method_def
@@ -35,10 +35,15 @@
    a null pointer of type person to a null pointer of type robot
 """
 
+import sys
+
+from bparser import ListWithLineNumber
 from intbase import InterpreterBase, ErrorType
 from v3_type_value import Type, create_value, create_default_value
 
 class VariableDef:
+    __slots__ = ("type", "name", "value")
+
     # var_type is a Type() and value is a Value()
     def __init__(self, var_type, var_name, value=None):
         self.type = var_type
@@ -53,7 +58,7 @@ class VariableDef:
 # [method return_type method_name [[type1 param1] [type2 param2] ...] [statement]]
 class MethodDef:
     def __init__(self, method_source):
-        self.line_num = method_source[0].line_num  # used for errors
+        self.line_num = method_source.line_num  # used for errors
         self.method_name = method_source[2]
         if method_source[1] == InterpreterBase.VOID_DEF:
             self.return_type = Type(InterpreterBase.NOTHING_DEF)
@@ -61,6 +66,14 @@ class MethodDef:
             self.return_type = Type(method_source[1])
         self.formal_params = self.__parse_params(method_source[3])
         self.code = method_source[4]
+        self.body = None  # compiled form of code, set by MethodCompiler (see v3_compiler.py)
+        self.set_frame_size(len(self.formal_params))
+
+    # frame_size is the number of slots for params and locals in a frame of this method (see v3_env.py), as worked
+    # out by MethodCompiler; local_slots holds the initial (empty) values of the locals' slots
+    def set_frame_size(self, frame_size):
+        self.frame_size = frame_size
+        self.local_slots = (None,) * (frame_size - len(self.formal_params))
 
     def get_method_name(self):
         return self.method_name
@@ -85,6 +98,80 @@ class MethodDef:
         return formal_params
 
 
+# the per-class shape of an object, computed once per ClassDef. An object is a single list of slots holding the
+# fields of its class and of all of its superclasses, base class fields first, so each class's fields sit at the same
+# indices in objects of the class and of all its subclasses. slot_index only maps the class's own fields, since
+# methods can't see the fields of other classes; field_types and default_values cover every slot.
+class ObjectLayout:
+    def __init__(self, fields, superclass_layout=None):
+        inherited_types = superclass_layout.field_types if superclass_layout else ()
+        inherited_values = superclass_layout.default_values if superclass_layout else ()
+        offset = len(inherited_types)
+        self.slot_index = {var_def.name: offset + index for index, var_def in enumerate(fields)}
+        self.field_types = inherited_types + tuple(var_def.type for var_def in fields)
+        self.default_values = inherited_values + tuple(var_def.value for var_def in fields)
+
+
+# the source of a template class, [tclass name [param1 param2 ...] [field1] ... [method1] ...], prepared once so that
+# instantiating it only rewrites the tokens that name a type parameter. Those substitution sites are the tokens that
+# are a parameter name, or a template class initializer with a parameter name in it (e.g. node@field_type); string
+# constants and other tokens are left alone, even if a parameter name is part of them. An instantiation copies just
+# the lists on the paths to the sites and shares the rest of the source with the template.
+class ClassTemplate:
+    def __init__(self, class_source, parameter_names):
+        self.class_source = class_source
+        self.parameter_index = {name: index for index, name in enumerate(parameter_names)}
+        # (index in class_source, site) for each member with a site in it; see __find_sites()
+        self.sites = []
+        for index in range(3, len(class_source)):
+            site = self.__find_sites(class_source[index])
+            if site is not None:
+                self.sites.append((index, site))
+
+    # returns the source of the class named class_name that instantiates this template with provided_types, the type
+    # name for each parameter in order: [class class_name [field1] ... [method1] ...]
+    def instantiate(self, class_name, provided_types):
+        source = ListWithLineNumber((InterpreterBase.CLASS_DEF, class_name))
+        source.extend(self.class_source[3:])
+        source.line_num = self.class_source.line_num
+        for index, site in self.sites:
+            source[index - 1] = ClassTemplate.__substitute(site, provided_types)  # the parameter list is dropped
+        return source
+
+    # returns None if there is no substitution site in item; for a list, [item, [(index, site), ...]] for the items
+    # with a site in them; for a token that's a site, a tuple of its @-separated parts, with the index of the
+    # parameter in place of each parameter name
+    def __find_sites(self, item):
+        if isinstance(item, list):
+            sites = []
+            for index, nested in enumerate(item):
+                site = self.__find_sites(nested)
+                if site is not None:
+                    sites.append((index, site))
+            return [item, sites] if sites else None
+        if not isinstance(item, str) or item.startswith('"'):  # a string constant
+            return None
+        parts = item.split(InterpreterBase.TYPE_CONCAT_CHAR)
+        if not any(part in self.parameter_index for part in parts):
+            return None
+        return tuple(self.parameter_index.get(part, part) for part in parts)
+
+    @staticmethod
+    def __substitute(site, provided_types):
+        if isinstance(site, tuple):
+            return sys.intern(
+                InterpreterBase.TYPE_CONCAT_CHAR.join(
+                    provided_types[part] if isinstance(part, int) else part for part in site
+                )
+            )
+        item, sites = site
+        copied = ListWithLineNumber(item)
+        copied.line_num = item.line_num
+        for index, nested_site in sites:
+            copied[index] = ClassTemplate.__substitute(nested_site, provided_types)
+        return copied
+
+
 # holds definition for a class, including a list of all the fields and their default values, all
 # of the methods in the class, and the superclass information (if any)
 # v2 class definition: [class classname [inherits baseclassname] [field1] [field2] ... [method1] [method2] ...]
@@ -98,12 +185,16 @@ class ClassDef:
             self.__check_for_inheritance_and_set_superclass_info(class_source)
         )
         self.parameter_type_strings = []
+        self.template = None  # the ClassTemplate of a template class, once its parameters are set
         self.is_template_class = is_template_class
 
         # If not template class, get fields and methods at compile time
         if not is_template_class:
             self.__create_field_list(class_source[fields_and_methods_start_index:])
+            superclass_layout = self.super_class.layout if self.super_class else None
+            self.layout = ObjectLayout(self.fields, superclass_layout)
             self.__create_method_list(class_source[fields_and_methods_start_index:])
+            self.__create_vtable()
 
     # get the classname
     def get_name(self):
@@ -124,6 +215,7 @@ class ClassDef:
     # For templating - allow for initializing first, then setting parameter type strings
     def set_parameter_type_strings(self, parameter_type_strings):
         self.parameter_type_strings = parameter_type_strings
+        self.template = ClassTemplate(self.class_source, parameter_type_strings)
 
     def __check_for_inheritance_and_set_superclass_info(self, class_source):
         if class_source[2] != InterpreterBase.INHERITS_DEF:
@@ -132,7 +224,7 @@ class ClassDef:
 
         super_class_name = class_source[3]
         self.super_class = self.interpreter.get_class_def(
-            super_class_name, class_source[0].line_num
+            super_class_name, class_source.line_num
         )
         return 4  # fields and method definitions start after [class classname inherits baseclassname ...]
 
@@ -147,15 +239,9 @@ class ClassDef:
                     self.interpreter.error(
                         ErrorType.NAME_ERROR,
                         "duplicate field " + member[2],
-                        member[0].line_num,
+                        member.line_num,
                     )
 
-                # Check if this is a template class
-                # If it contains @, then it's actually an initializer string!
-                if self.is_template_class and self.interpreter.is_initializer_str(member[1]):
-                    initializer_str = member[1]
-                    self.interpreter.create_class_def_from_template(initializer_str)
-
                 var_def = self.__create_variable_def_from_field(member, self.is_template_class)
                 self.fields.append(var_def)
                 self.field_map[member[2]] = var_def
@@ -180,7 +266,7 @@ class ClassDef:
                 self.interpreter.error(
                     ErrorType.TYPE_ERROR,
                     "invalid type/type mismatch with field " + field_def[2],
-                    field_def[0].line_num,
+                    field_def.line_num,
                 )
         return var_def
 
@@ -190,26 +276,30 @@ class ClassDef:
         methods_defined_so_far = set()
         for member in class_body:
             if member[0] == InterpreterBase.METHOD_DEF:
-                # Check if this is a template class
-                # If it contains @, then it's actually an initializer string!
-                if self.is_template_class and self.interpreter.is_initializer_str(member[1]):
-                    initializer_str = member[1]
-                    self.interpreter.create_class_def_from_template(initializer_str)
-
                 method_def = MethodDef(member)
                 if method_def.method_name in methods_defined_so_far:  # redefinition
                     self.interpreter.error(
                         ErrorType.NAME_ERROR,
                         "duplicate method " + method_def.method_name,
-                        member[0].line_num,
+                        member.line_num,
                     )
                 self.__check_method_names_and_types(method_def)
+                self.interpreter.compile_method(self, method_def)
                 self.methods.append(method_def)
                 self.method_map[method_def.method_name] = method_def
                 methods_defined_so_far.add(method_def.method_name)
 
-    # for a given method, make sure that the parameter types are valid, return type is valid, and param names
-    # are not duplicated
+    # maps (method name, number of parameters) to the methods an object of this class could run for such a call,
+    # as (MethodDef, defining ClassDef) pairs ordered from this class up to the base class; a call runs the first
+    # one whose parameter types accept the arguments
+    def __create_vtable(self):
+        self.vtable = dict(self.super_class.vtable) if self.super_class else {}
+        for method_def in self.methods:
+            key = (method_def.method_name, len(method_def.formal_params))
+            self.vtable[key] = ((method_def, self),) + self.vtable.get(key, ())
+
+    # for a given method, make sure that the parameter types and the return type are valid; a duplicated param name
+    # is reported when the method is called (see MethodCompiler.compile_method)
     def __check_method_names_and_types(self, method_def):
         if not self.interpreter.is_valid_type(
             method_def.return_type.type_name
@@ -219,14 +309,7 @@ class ClassDef:
                 "invalid return type for method " + method_def.method_name,
                 method_def.line_num,
             )
-        used_param_names = set()
         for param in method_def.formal_params:
-            if param.name in used_param_names:
-                self.interpreter.error(
-                    ErrorType.NAME_ERROR,
-                    "duplicate formal parameter " + param.name,
-                    method_def.line_num,
-                )
             if not self.interpreter.is_valid_type(param.type.type_name):
                 self.interpreter.error(
                     ErrorType.TYPE_ERROR,
@@ -0,0 +1,588 @@
+"""
+Closure-compilation backend for the v3 interpreter, selected with Interpreter(engine=Interpreter.ENGINE_CLOSURE).
+
+ClosureCompiler takes the v3_ast tree that MethodCompiler built for a method and turns every statement and
+expression in it into a nested Python closure. Everything that can be known when the method is loaded (operator
+functions, constant Values, types, variable names, line numbers) is captured by the closures, so running a method
+is just a chain of plain function calls. The closures have exactly the same semantics as the v3_ast nodes they
+were built from: statements return None or the Value the method is leaving with, and expressions return Values.
+"""
+
+from intbase import InterpreterBase, ErrorType
+from v3_ast import (
+    compile_unboxed,
+    GuardFailed,
+    TraceNode,
+    InvalidStatementNode,
+    BeginNode,
+    LetNode,
+    SetNode,
+    IfNode,
+    WhileNode,
+    ReturnNode,
+    PrintNode,
+    InputNode,
+    CallStatementNode,
+    TryNode,
+    ThrowNode,
+    InvalidExpressionNode,
+    LocalNode,
+    FieldNode,
+    MeNode,
+    UnresolvedNameNode,
+    ConstantNode,
+    BinaryOpNode,
+    UnaryOpNode,
+    CallNode,
+    NewNode,
+)
+from v3_object import ObjectDef
+from v3_operators import BINARY_OPS, PRIMITIVE_BINARY_OPS
+from v3_env import TailCall
+from v3_type_value import create_default_value
+from v3_type_value import Value, bool_value, int_value, null_value
+
+INT_TYPE = ObjectDef.INT_TYPE_CONST
+STRING_TYPE = ObjectDef.STRING_TYPE_CONST
+BOOL_TYPE = ObjectDef.BOOL_TYPE_CONST
+EXCEPTION_TYPE = ObjectDef.EXCEPTION_TYPE_CONST
+
+
+# stands in for the v3_ast tree as MethodDef.body, so ObjectDef.call_method can run either one
+class ClosureBody:
+    def __init__(self, statement_fn):
+        self.execute = statement_fn
+
+
+class ClosureCompiler:
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.statement_compilers = {
+            TraceNode: self.__compile_trace,
+            InvalidStatementNode: self.__compile_invalid_statement,
+            BeginNode: self.__compile_begin,
+            LetNode: self.__compile_let,
+            SetNode: self.__compile_set,
+            IfNode: self.__compile_if,
+            WhileNode: self.__compile_while,
+            ReturnNode: self.__compile_return,
+            PrintNode: self.__compile_print,
+            InputNode: self.__compile_input,
+            CallStatementNode: self.__compile_call_statement,
+            TryNode: self.__compile_try,
+            ThrowNode: self.__compile_throw,
+        }
+        self.expression_compilers = {
+            InvalidExpressionNode: self.__compile_invalid_expression,
+            LocalNode: self.__compile_local,
+            FieldNode: self.__compile_field,
+            MeNode: self.__compile_me,
+            UnresolvedNameNode: self.__compile_unresolved_name,
+            ConstantNode: self.__compile_constant,
+            BinaryOpNode: self.__compile_binary_op,
+            UnaryOpNode: self.__compile_unary_op,
+            CallNode: self.__compile_call,
+            NewNode: self.__compile_new,
+        }
+
+    # replaces the v3_ast tree in method_def.body with its closure-compiled equivalent
+    def compile_method(self, method_def):
+        method_def.body = ClosureBody(self.compile_statement(method_def.body))
+
+    def compile_statement(self, node):
+        return self.statement_compilers[type(node)](node)
+
+    def compile_expression(self, node):
+        return self.expression_compilers[type(node)](node)
+
+    def __compile_trace(self, node):
+        statement = self.compile_statement(node.statement)
+        trace_line = f"{node.line_num}: {node.code}"
+
+        def run_trace(obj, frame):
+            print(trace_line)
+            return statement(obj, frame)
+
+        return run_trace
+
+    def __compile_invalid_statement(self, node):
+        error_type, description, line_num = node.error_type, node.description, node.line_num
+
+        def run_invalid_statement(obj, frame):
+            obj.interpreter.error(error_type, description, line_num)
+
+        return run_invalid_statement
+
+    def __compile_begin(self, node):
+        statements = tuple(self.compile_statement(s) for s in node.statements)
+
+        def run_begin(obj, frame):
+            for statement in statements:
+                result = statement(obj, frame)
+                if result is not None:
+                    return result
+            return None
+
+        return run_begin
+
+    def __compile_let(self, node):
+        run_block = self.__compile_begin(node)
+        line_num = node.line_num
+        local_defs = node.local_defs
+
+        def run_let(obj, frame):
+            interpreter = obj.interpreter
+            for template_initializer, var_type, initial_value, var_name, slot, is_duplicate in local_defs:
+                # Handle templated class types that weren't built when the program was loaded
+                if template_initializer is not None:
+                    interpreter.create_class_def_from_template(template_initializer, line_num)
+                if initial_value is None:
+                    interpreter.error(
+                        ErrorType.SYNTAX_ERROR,
+                        "initial value of local variable " + var_name + " must be a constant",
+                        line_num,
+                    )
+                obj.check_type_compatibility(var_type, initial_value.type(), True, line_num)
+                if is_duplicate:
+                    interpreter.error(
+                        ErrorType.NAME_ERROR,
+                        "duplicate local variable name " + var_name,
+                        line_num,
+                    )
+                frame[slot] = initial_value
+            return run_block(obj, frame)
+
+        return run_let
+
+    def __compile_set(self, node):
+        expression = self.compile_expression(node.expression)
+        assign = self.__compile_assignment(node.target)
+
+        def run_set(obj, frame):
+            val = expression(obj, frame)
+            if val.t is EXCEPTION_TYPE:
+                return val
+            assign(obj, frame, val)
+            return None
+
+        return run_set
+
+    def __compile_if(self, node):
+        condition = self.compile_expression(node.condition)
+        then_statement = self.compile_statement(node.then_statement)
+        else_statement = None
+        if node.else_statement is not None:
+            else_statement = self.compile_statement(node.else_statement)
+        code, line_num = node.code, node.line_num
+
+        def run_if(obj, frame):
+            cond = condition(obj, frame)
+            if cond.t is EXCEPTION_TYPE:
+                return cond
+            if cond.t is not BOOL_TYPE:
+                obj.interpreter.error(
+                    ErrorType.TYPE_ERROR,
+                    "non-boolean if condition " + " ".join(x for x in code[1]),
+                    line_num,
+                )
+            if cond.v:
+                return then_statement(obj, frame)
+            if else_statement is not None:
+                return else_statement(obj, frame)
+            return None
+
+        return run_if
+
+    def __compile_while(self, node):
+        condition = self.compile_expression(node.condition)
+        body = self.compile_statement(node.body)
+        code, line_num = node.code, node.line_num
+
+        def run_while(obj, frame):
+            while True:
+                cond = condition(obj, frame)
+                if cond.t is EXCEPTION_TYPE:
+                    return cond
+                if cond.t is not BOOL_TYPE:
+                    obj.interpreter.error(
+                        ErrorType.TYPE_ERROR,
+                        "non-boolean while condition " + " ".join(x for x in code[1]),
+                        line_num,
+                    )
+                if not cond.v:
+                    return None
+                result = body(obj, frame)
+                if result is not None:
+                    return result
+
+        return run_while
+
+    def __compile_return(self, node):
+        return_type, line_num = node.return_type, node.line_num
+        if node.expression is None:
+
+            def run_bare_return(obj, frame):
+                return create_default_value(return_type)
+
+            return run_bare_return
+
+        if node.is_tail_call:
+            # the call returns a TailCall for the method's runner (see v3_env.py) or an exception Value
+            return self.__compile_call(node.expression, return_type)
+
+        expression = self.compile_expression(node.expression)
+
+        def run_return(obj, frame):
+            result = expression(obj, frame)
+            if result.t is EXCEPTION_TYPE:
+                return result
+            if result.is_typeless_null():
+                obj.check_type_compatibility(return_type, result.t, True, line_num)
+                result = null_value(return_type)  # propagate return type to null
+            obj.check_type_compatibility(return_type, result.t, True, line_num)
+            return result
+
+        return run_return
+
+    def __compile_print(self, node):
+        expressions = tuple(self.compile_expression(e) for e in node.expressions)
+
+        def run_print(obj, frame):
+            output = ""
+            for expression in expressions:
+                term = expression(obj, frame)
+                typ = term.t
+                if typ is EXCEPTION_TYPE:
+                    return term
+                val = term.v
+                if typ is BOOL_TYPE:
+                    val = "true" if val == True else "false"
+                output += str(val)
+            obj.interpreter.output(output)
+            return None
+
+        return run_print
+
+    def __compile_input(self, node):
+        assign = self.__compile_assignment(node.target)
+        get_string = node.get_string
+
+        def run_input(obj, frame):
+            inp = obj.interpreter.get_input()
+            if get_string:
+                val = Value(STRING_TYPE, inp)
+            else:
+                val = int_value(int(inp))
+            assign(obj, frame, val)
+            return None
+
+        return run_input
+
+    def __compile_call_statement(self, node):
+        call = self.compile_expression(node.call)
+
+        def run_call_statement(obj, frame):
+            val = call(obj, frame)
+            if val.t is EXCEPTION_TYPE:
+                return val
+            return None
+
+        return run_call_statement
+
+    def __compile_try(self, node):
+        try_statement = self.compile_statement(node.try_statement)
+        catch_statement = None
+        if node.catch_statement is not None:
+            catch_statement = self.compile_statement(node.catch_statement)
+        line_num, exception_slot = node.line_num, node.exception_slot
+
+        def run_try(obj, frame):
+            result = try_statement(obj, frame)
+            if result is None or result.t is not EXCEPTION_TYPE:
+                return result
+            if catch_statement is None:
+                obj.interpreter.error(
+                    ErrorType.SYNTAX_ERROR,
+                    "try statement must have two statements",
+                    line_num,
+                )
+            frame[exception_slot] = Value(STRING_TYPE, result.v)
+            return catch_statement(obj, frame)
+
+        return run_try
+
+    def __compile_throw(self, node):
+        line_num = node.line_num
+        if node.expression is None:
+
+            def run_invalid_throw(obj, frame):
+                obj.interpreter.error(
+                    ErrorType.SYNTAX_ERROR,
+                    "throw statement must have an expression next to it",
+                    line_num,
+                )
+
+            return run_invalid_throw
+
+        expression = self.compile_expression(node.expression)
+
+        def run_throw(obj, frame):
+            val = expression(obj, frame)
+            if val.t is not STRING_TYPE:
+                obj.interpreter.error(
+                    ErrorType.TYPE_ERROR,
+                    "throw statement must throw a string",
+                    line_num,
+                )
+            return Value(EXCEPTION_TYPE, val.v)
+
+        return run_throw
+
+    def __compile_invalid_expression(self, node):
+        description, line_num = node.description, node.line_num
+
+        def eval_invalid_expression(obj, frame):
+            obj.interpreter.error(ErrorType.SYNTAX_ERROR, description, line_num)
+
+        return eval_invalid_expression
+
+    def __compile_local(self, node):
+        slot, var_type = node.slot, node.var_type
+
+        def eval_local(obj, frame):
+            value = frame[slot]
+            if value.v is None and value.is_null():
+                return null_value(var_type)
+            return value
+
+        return eval_local
+
+    def __compile_field(self, node):
+        field_index = node.field_index
+
+        def eval_field(obj, frame):
+            value = obj.slots[field_index]
+            if value.v is None and value.is_null():
+                return null_value(obj.layout.field_types[field_index])
+            return value
+
+        return eval_field
+
+    def __compile_me(self, node):
+        def eval_me(obj, frame):
+            return obj.get_me_as_value()
+
+        return eval_me
+
+    def __compile_unresolved_name(self, node):
+        return node.evaluate
+
+    # returns a function(obj, frame, value) that assigns to the target of a set or input statement
+    def __compile_assignment(self, target):
+        line_num = target.line_num
+        if isinstance(target, LocalNode):
+            slot, var_type = target.slot, target.var_type
+
+            def assign_local(obj, frame, value):
+                obj.check_type_compatibility(var_type, value.t, True, line_num)
+                frame[slot] = value
+
+            return assign_local
+        if isinstance(target, FieldNode):
+            field_index = target.field_index
+
+            def assign_field(obj, frame, value):
+                obj.set_field(field_index, value, line_num)
+
+            return assign_field
+        return target.assign
+
+    def __compile_constant(self, node):
+        value = node.value
+
+        def eval_constant(obj, frame):
+            return value
+
+        return eval_constant
+
+    def __compile_binary_op(self, node):
+        operand1 = self.compile_expression(node.operand1)
+        operand2 = self.compile_expression(node.operand2)
+        op, line_num = node.operator, node.line_num
+        int_op = PRIMITIVE_BINARY_OPS[INT_TYPE].get(op)
+        string_op = PRIMITIVE_BINARY_OPS[STRING_TYPE].get(op)
+        bool_op = PRIMITIVE_BINARY_OPS[BOOL_TYPE].get(op)
+        object_op = BINARY_OPS[InterpreterBase.CLASS_DEF].get(op)
+        site = node.site
+        observe = site.observe
+
+        def eval_generic(obj, a, b):
+            type_a = a.t
+            if type_a is b.t:
+                if type_a is INT_TYPE:
+                    if int_op is None:
+                        obj.interpreter.error(
+                            ErrorType.TYPE_ERROR, "invalid operator applied to ints", line_num
+                        )
+                    observe(type_a)
+                    return int_op(a.v, b.v)
+                if type_a is STRING_TYPE:
+                    if string_op is None:
+                        obj.interpreter.error(
+                            ErrorType.TYPE_ERROR, "invalid operator applied to strings", line_num
+                        )
+                    observe(type_a)
+                    return string_op(a.v, b.v)
+                if type_a is BOOL_TYPE:
+                    if bool_op is None:
+                        obj.interpreter.error(
+                            ErrorType.TYPE_ERROR, "invalid operator applied to bool", line_num
+                        )
+                    observe(type_a)
+                    return bool_op(a.v, b.v)
+            # handle object reference comparisons last
+            if obj.interpreter.check_type_compatibility(type_a, b.t, False):
+                if object_op is None:
+                    obj.interpreter.error(
+                        ErrorType.TYPE_ERROR,
+                        f"operator {op} applied to object references",
+                        line_num,
+                    )
+                return object_op(a, b)
+            # Either operand was an error, re-throw exception immediately
+            if type_a is EXCEPTION_TYPE:
+                return a
+            if b.t is EXCEPTION_TYPE:
+                return b
+            obj.interpreter.error(
+                ErrorType.TYPE_ERROR,
+                f"operator {op} applied to two incompatible types",
+                line_num,
+            )
+
+        def eval_binary_op(obj, frame):
+            a = operand1(obj, frame)
+            b = operand2(obj, frame)
+            if a.t is site.fast_type and b.t is site.fast_type:
+                return site.fast_op(a.v, b.v)
+            return eval_generic(obj, a, b)
+
+        if node.unboxed is None:
+            return self.__compile_unboxed(node, eval_binary_op)
+        return eval_binary_op
+
+    # an expression of nothing but operators, locals and constants runs unboxed once each operator in it has been
+    # specialized (see compile_unboxed() in v3_ast.py); eval_boxed evaluates it otherwise
+    def __compile_unboxed(self, node, eval_boxed):
+        unboxed = None
+
+        def eval_unboxed(obj, frame):
+            nonlocal unboxed
+            if unboxed:
+                try:
+                    return unboxed(obj, frame)
+                except GuardFailed:
+                    return eval_boxed(obj, frame)
+            result = eval_boxed(obj, frame)
+            if unboxed is None:
+                unboxed = compile_unboxed(node)
+            return result
+
+        return eval_unboxed
+
+    def __compile_unary_op(self, node):
+        operand = self.compile_expression(node.operand)
+        op, line_num = node.operator, node.line_num
+
+        def eval_unary_op(obj, frame):
+            a = operand(obj, frame)
+            if a.t is BOOL_TYPE:
+                return bool_value(not a.v)
+            if a.t is EXCEPTION_TYPE:
+                return a
+            obj.interpreter.error(
+                ErrorType.TYPE_ERROR,
+                f"unary operator {op} applied to non-bool",
+                line_num,
+            )
+
+        return eval_unary_op
+
+    # tail_return_type is given to compile the call of a tail call return statement, which returns a TailCall with
+    # that return type instead of running the method
+    def __compile_call(self, node, tail_return_type=None):
+        args = tuple(self.compile_expression(a) for a in node.args)
+        method_name, line_num, class_def = node.method_name, node.line_num, node.class_def
+        is_tail_call = tail_return_type is not None
+        find_method = node.cache.find_method
+
+        def eval_args(obj, frame):
+            actual_args = []
+            for arg in args:
+                val = arg(obj, frame)
+                if val.t is EXCEPTION_TYPE:
+                    return val
+                actual_args.append(val)
+            return actual_args
+
+        if node.target == InterpreterBase.ME_DEF:
+
+            def eval_call_me(obj, frame):
+                actual_args = eval_args(obj, frame)
+                if type(actual_args) is not list:
+                    return actual_args
+                method_def = find_method(obj, method_name, actual_args, False, line_num, class_def)
+                if is_tail_call:
+                    return TailCall(obj, method_def, actual_args, tail_return_type, line_num)
+                return obj.run_method(method_def, actual_args, line_num)
+
+            return eval_call_me
+
+        if node.target == InterpreterBase.SUPER_DEF:
+            superclass_def = class_def.get_superclass()
+
+            def eval_call_super(obj, frame):
+                if superclass_def is None:
+                    obj.interpreter.error(
+                        ErrorType.TYPE_ERROR,
+                        "invalid call to super object by class " + class_def.get_name(),
+                        line_num,
+                    )
+                actual_args = eval_args(obj, frame)
+                if type(actual_args) is not list:
+                    return actual_args
+                method_def = find_method(obj, method_name, actual_args, True, line_num, superclass_def)
+                if is_tail_call:
+                    return TailCall(obj, method_def, actual_args, tail_return_type, line_num)
+                return obj.run_method(method_def, actual_args, line_num)
+
+            return eval_call_super
+
+        target = self.compile_expression(node.target)
+
+        def eval_call(obj, frame):
+            obj_val = target(obj, frame)
+            if obj_val.t is EXCEPTION_TYPE:
+                return obj_val
+            if obj_val.is_null():
+                obj.interpreter.error(ErrorType.FAULT_ERROR, "null dereference", line_num)
+            actual_args = eval_args(obj, frame)
+            if type(actual_args) is not list:
+                return actual_args
+            method_def = find_method(obj_val.v, method_name, actual_args, False, line_num)
+            if is_tail_call:
+                return TailCall(obj_val.v, method_def, actual_args, tail_return_type, line_num)
+            return obj_val.v.run_method(method_def, actual_args, line_num)
+
+        return eval_call
+
+    def __compile_new(self, node):
+        class_type = node.class_type
+        get_class_def = node.get_class_def
+
+        def eval_new(obj, frame):
+            interpreter = obj.interpreter
+            class_def = node.class_def or get_class_def(interpreter)
+            return Value(class_type, ObjectDef(interpreter, class_def, interpreter.trace_output))
+
+        return eval_new
@@ -0,0 +1,360 @@
+from intbase import InterpreterBase, ErrorType
+from v3_operators import BINARY_OPERATORS, UNARY_OPERATORS, BINARY_OPS
+from v3_type_value import BOOL_TYPE, STRING_TYPE, Type, bool_value, create_value, create_default_value
+from v3_ast import (
+    TraceNode,
+    InvalidStatementNode,
+    BeginNode,
+    LetNode,
+    SetNode,
+    IfNode,
+    WhileNode,
+    ReturnNode,
+    PrintNode,
+    InputNode,
+    CallStatementNode,
+    TryNode,
+    ThrowNode,
+    InvalidExpressionNode,
+    LocalNode,
+    FieldNode,
+    MeNode,
+    UnresolvedNameNode,
+    ConstantNode,
+    BinaryOpNode,
+    UnaryOpNode,
+    CallNode,
+    NewNode,
+)
+
+
+# types whose constants can be folded at compile time
+FOLDABLE_TYPES = {
+    Type(InterpreterBase.INT_DEF): InterpreterBase.INT_DEF,
+    Type(InterpreterBase.STRING_DEF): InterpreterBase.STRING_DEF,
+    Type(InterpreterBase.BOOL_DEF): InterpreterBase.BOOL_DEF,
+}
+
+
+# returns the line number of the first token in a (possibly nested) statement, or None if there isn't one; each list
+# from BParser carries it (see ListWithLineNumber in bparser.py), which tokens don't in the compact form the
+# interpreter parses programs into
+def get_line_num(code):
+    return getattr(code, "line_num", None)
+
+
+# returns the name of the first of formal_params (VariableDefs) that repeats an earlier one, or None
+def find_duplicate_param(formal_params):
+    for index, param in enumerate(formal_params):
+        if any(earlier.name == param.name for earlier in formal_params[:index]):
+            return param.name
+    return None
+
+
+# Turns the body of each method into a tree of v3_ast nodes. This runs once per method, when its ClassDef is
+# created, so the keyword and operator tokens of each statement are only ever compared here and never while the
+# program runs. Malformed statements compile to nodes that report the problem if they're ever executed, so a
+# method with a bad statement in a branch that never runs behaves the same as before.
+# Literals are parsed into Values here, and operators applied to constants are folded into a single constant.
+# Parameters and let locals are resolved here too: each gets a slot in the method's frame (see v3_env.py), and every
+# reference to it is compiled with that slot and its declared type, as a (slot, Type) pair.
+class MethodCompiler:
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.statement_compilers = {
+            InterpreterBase.BEGIN_DEF: self.__compile_begin,
+            InterpreterBase.SET_DEF: self.__compile_set,
+            InterpreterBase.IF_DEF: self.__compile_if,
+            InterpreterBase.CALL_DEF: self.__compile_call_statement,
+            InterpreterBase.WHILE_DEF: self.__compile_while,
+            InterpreterBase.RETURN_DEF: self.__compile_return,
+            InterpreterBase.INPUT_STRING_DEF: self.__compile_input,
+            InterpreterBase.INPUT_INT_DEF: self.__compile_input,
+            InterpreterBase.PRINT_DEF: self.__compile_print,
+            InterpreterBase.LET_DEF: self.__compile_let,
+            InterpreterBase.TRY_DEF: self.__compile_try,
+            InterpreterBase.THROW_DEF: self.__compile_throw,
+        }
+
+    # compiles method_def.code and stores the result as method_def.body; class_def is the class that defines the
+    # method, which determines the fields it can see and where calls on me and super start looking for methods
+    def compile_method(self, class_def, method_def):
+        self.class_def = class_def
+        self.method_def = method_def
+        # innermost scope last; parameters take the first slots of the frame, in order
+        self.scopes = [
+            {param.name: (slot, param.type) for slot, param in enumerate(method_def.formal_params)}
+        ]
+        self.next_slot = self.frame_size = len(method_def.formal_params)
+        # number of try parts of try statements being compiled; a call can't be a tail call inside one, since the
+        # try statement has to see any exception the call raises
+        self.try_depth = 0
+        duplicate_param = find_duplicate_param(method_def.formal_params)
+        if duplicate_param is not None:
+            # reported when the method is called, before anything in it runs
+            method_def.body = InvalidStatementNode(
+                method_def.code,
+                method_def.line_num,
+                "duplicate formal param name " + duplicate_param,
+                ErrorType.NAME_ERROR,
+            )
+        else:
+            method_def.body = self.compile_statement(method_def.code)
+        method_def.set_frame_size(self.frame_size)
+
+    def compile_statement(self, code):
+        line_num = get_line_num(code)
+        if not isinstance(code, list) or not code or not isinstance(code[0], str):
+            return InvalidStatementNode(code, line_num, "unknown statement " + str(code))
+        compile_fn = self.statement_compilers.get(code[0])
+        if compile_fn is None:
+            return InvalidStatementNode(code, line_num, "unknown statement " + code[0])
+        try:
+            statement = compile_fn(code, line_num)
+        except IndexError:
+            statement = InvalidStatementNode(code, line_num, "malformed statement " + code[0])
+        if self.interpreter.trace_output:
+            statement = TraceNode(statement)
+        return statement
+
+    # returns the slot index of name if it's a field of the class being compiled (see ObjectLayout in v3_class.py),
+    # else None
+    def __get_field_index(self, name):
+        return self.class_def.layout.slot_index.get(name)
+
+    # returns the (frame slot, Type) of the innermost parameter or local named name in scope, or None
+    def __get_local(self, name):
+        for scope in reversed(self.scopes):
+            local = scope.get(name)
+            if local is not None:
+                return local
+        return None
+
+    # opens a scope for a block that declares locals; slots are reused by blocks that aren't nested in each other
+    def __enter_scope(self):
+        self.scopes.append({})
+        return self.next_slot
+
+    def __declare_local(self, name, var_type):
+        slot = self.next_slot
+        self.next_slot += 1
+        self.frame_size = max(self.frame_size, self.next_slot)
+        self.scopes[-1][name] = (slot, var_type)
+        return slot
+
+    def __exit_scope(self, first_slot):
+        self.scopes.pop()
+        self.next_slot = first_slot
+
+    # line_num is the line number of the enclosing statement
+    def compile_expression(self, expr, line_num):
+        if not isinstance(expr, list):
+            return self.__compile_name(expr, line_num)
+        if not expr or not isinstance(expr[0], str):
+            return InvalidExpressionNode(line_num, "invalid expression " + str(expr))
+        operator = expr[0]
+        try:
+            if operator in BINARY_OPERATORS:
+                return self.__compile_binary_op(
+                    line_num,
+                    operator,
+                    self.compile_expression(expr[1], line_num),
+                    self.compile_expression(expr[2], line_num),
+                )
+            if operator in UNARY_OPERATORS:
+                return self.__compile_unary_op(
+                    line_num, operator, self.compile_expression(expr[1], line_num)
+                )
+            if operator == InterpreterBase.CALL_DEF:
+                return self.__compile_call(expr, line_num)
+            if operator == InterpreterBase.NEW_DEF:
+                return NewNode(line_num, expr[1])
+        except IndexError:
+            return InvalidExpressionNode(line_num, "malformed expression " + operator)
+        return InvalidExpressionNode(line_num, "unknown operator " + operator)
+
+    # classifies a name that's read: the innermost parameter or local in scope shadows a field of the class, and
+    # a token like 5 is a constant only if neither exists
+    def __compile_name(self, name, line_num):
+        variable = self.__resolve_variable(name, line_num)
+        if variable is not None:
+            return variable
+        constant = create_value(name)
+        if constant is not None:
+            return ConstantNode(line_num, constant)
+        if name == InterpreterBase.ME_DEF:
+            return MeNode(line_num, name)
+        return self.__compile_unresolved_name(name, line_num, "invalid field or parameter ")
+
+    # classifies the name that a set or input statement assigns to
+    def __compile_target(self, name, line_num):
+        variable = self.__resolve_variable(name, line_num)
+        if variable is not None:
+            return variable
+        return self.__compile_unresolved_name(name, line_num, "unknown field/variable ")
+
+    # returns a LocalNode or FieldNode for name, or None if it's neither a variable in scope nor a field
+    def __resolve_variable(self, name, line_num):
+        local = self.__get_local(name)
+        if local is not None:
+            slot, var_type = local
+            return LocalNode(line_num, name, slot, var_type, slot < len(self.method_def.formal_params))
+        field_index = self.__get_field_index(name)
+        if field_index is not None:
+            return FieldNode(line_num, name, field_index)
+        return None
+
+    # the name is reported now, but is only an error if the code that uses it runs; template classes are reported
+    # when they're instantiated
+    def __compile_unresolved_name(self, name, line_num, description):
+        if not self.class_def.is_template_class:
+            self.interpreter.report_diagnostic(
+                ErrorType.NAME_ERROR,
+                f"{description}{name} in method {self.method_def.method_name} of class {self.class_def.name}",
+                line_num,
+            )
+        return UnresolvedNameNode(line_num, name)
+
+    # operators on two constants of the same primitive type are applied now; anything that would be an error
+    # (including division by zero) is left for when, and if, the expression is evaluated
+    def __compile_binary_op(self, line_num, operator, operand1, operand2):
+        if isinstance(operand1, ConstantNode) and isinstance(operand2, ConstantNode):
+            value1, value2 = operand1.value, operand2.value
+            type_def = FOLDABLE_TYPES.get(value1.type())
+            if type_def is not None and value1.type() is value2.type():
+                operation = BINARY_OPS[type_def].get(operator)
+                if operation is not None:
+                    try:
+                        return ConstantNode(line_num, operation(value1, value2))
+                    except ZeroDivisionError:
+                        pass
+        return BinaryOpNode(line_num, operator, operand1, operand2)
+
+    def __compile_unary_op(self, line_num, operator, operand):
+        if isinstance(operand, ConstantNode) and operand.value.type() is BOOL_TYPE:
+            return ConstantNode(line_num, bool_value(not operand.value.value()))
+        return UnaryOpNode(line_num, operator, operand)
+
+    # (begin (statement1) (statement2) ... (statementn))
+    def __compile_begin(self, code, line_num):
+        return BeginNode(code, line_num, [self.compile_statement(s) for s in code[1:]])
+
+    # (let ((type1 var1 defval1) ... (typen varn defvaln)) (statement1) ... (statementn))
+    def __compile_let(self, code, line_num):
+        # (template class initializer, Type, initial value, varname, slot, is_duplicate) for each local; the
+        # initializer is the local's type name if it names a template class that hasn't been built yet (see
+        # Interpreter.create_class_def_from_template), and None otherwise; the initial value is None if it isn't a
+        # constant. That (as a SYNTAX_ERROR), duplicate names and invalid initializers are reported when the let runs
+        local_defs = []
+        interpreter = self.interpreter
+        first_slot = self.__enter_scope()
+        try:
+            for var_def in code[1]:
+                var_type = Type(var_def[0])
+                if len(var_def) > 2:
+                    initial_value = create_value(var_def[2]) if isinstance(var_def[2], str) else None
+                else:
+                    initial_value = create_default_value(var_type)
+                template_initializer = None
+                if var_def[0] not in interpreter.class_index and interpreter.is_initializer_str(var_def[0]):
+                    template_initializer = var_def[0]
+                var_name = var_def[1]
+                if var_name in self.scopes[-1]:
+                    local_defs.append((template_initializer, var_type, initial_value, var_name, None, True))
+                    continue
+                slot = self.__declare_local(var_name, var_type)
+                local_defs.append((template_initializer, var_type, initial_value, var_name, slot, False))
+            statements = [self.compile_statement(s) for s in code[2:]]
+        finally:
+            self.__exit_scope(first_slot)
+        return LetNode(code, line_num, local_defs, statements)
+
+    # (set varname expression)
+    def __compile_set(self, code, line_num):
+        return SetNode(
+            code,
+            line_num,
+            self.__compile_target(code[1], line_num),
+            self.compile_expression(code[2], line_num),
+        )
+
+    # (if expression (statement) [(statement)])
+    def __compile_if(self, code, line_num):
+        else_statement = None
+        if len(code) == 4:
+            else_statement = self.compile_statement(code[3])
+        return IfNode(
+            code,
+            line_num,
+            self.compile_expression(code[1], line_num),
+            self.compile_statement(code[2]),
+            else_statement,
+        )
+
+    # (while expression (statement))
+    def __compile_while(self, code, line_num):
+        return WhileNode(
+            code,
+            line_num,
+            self.compile_expression(code[1], line_num),
+            self.compile_statement(code[2]),
+        )
+
+    # (return [expression])
+    def __compile_return(self, code, line_num):
+        expression = None
+        if len(code) > 1:
+            expression = self.compile_expression(code[1], line_num)
+        is_tail_call = isinstance(expression, CallNode) and self.try_depth == 0
+        return ReturnNode(code, line_num, expression, self.method_def.get_return_type(), is_tail_call)
+
+    # (print expression1 expression2 ...)
+    def __compile_print(self, code, line_num):
+        return PrintNode(code, line_num, [self.compile_expression(e, line_num) for e in code[1:]])
+
+    # (inputs target_variable) or (inputi target_variable)
+    def __compile_input(self, code, line_num):
+        return InputNode(
+            code,
+            line_num,
+            self.__compile_target(code[1], line_num),
+            code[0] == InterpreterBase.INPUT_STRING_DEF,
+        )
+
+    # (call object_ref/me/super methodname p1 p2 p3)
+    def __compile_call_statement(self, code, line_num):
+        return CallStatementNode(code, line_num, self.__compile_call(code, line_num))
+
+    def __compile_call(self, code, line_num):
+        target = code[1]
+        if target != InterpreterBase.ME_DEF and target != InterpreterBase.SUPER_DEF:
+            target = self.compile_expression(target, line_num)
+        args = [self.compile_expression(e, line_num) for e in code[3:]]
+        call = CallNode(line_num, target, code[2], args, self.class_def)
+        self.interpreter.call_site_caches.append(call.cache)
+        return call
+
+    # (try (statement) (statement))
+    def __compile_try(self, code, line_num):
+        self.try_depth += 1
+        try:
+            try_statement = self.compile_statement(code[1])
+        finally:
+            self.try_depth -= 1
+        catch_statement = exception_slot = None
+        if len(code) == 3:
+            # the catch statement sees the thrown string as a local named exception
+            first_slot = self.__enter_scope()
+            exception_slot = self.__declare_local(InterpreterBase.EXCEPTION_VARIABLE_DEF, STRING_TYPE)
+            try:
+                catch_statement = self.compile_statement(code[2])
+            finally:
+                self.__exit_scope(first_slot)
+        return TryNode(code, line_num, try_statement, catch_statement, exception_slot)
+
+    # (throw expression)
+    def __compile_throw(self, code, line_num):
+        expression = None
+        if len(code) == 2:
+            expression = self.compile_expression(code[1], line_num)
+        return ThrowNode(code, line_num, expression)
@@ -1,48 +1,61 @@
-class EnvironmentManager:
-    """
-    The EnvironmentManager class keeps a mapping between each variable name (aka symbol)
-    in a brewin program and the VariableDef object, which stores the variable name, its type, and
-    the current value that the variable is set to (which could be the same type or a subtype of
-    the variable, in the case of object references).
-    """
-
-    def __init__(self):
-        self.environment = [{}]
-
-    # returns a VariableDef object
-    def get(self, symbol):
-        for env in reversed(self.environment):
-            if symbol in env:
-                return env[symbol]
-
-        return None
-
-    # create a new symbol in the most nested block's environment; error if
-    # the symbol already exists in the most nested block
-    # this is called for all variables defined in a let block or in formal parameters
-    def create_new_symbol(self, symbol):
-        if symbol not in self.environment[-1]:
-            self.environment[-1][symbol] = None
-            return True
-
-        return False
-
-    # set works with symbols that were already created via create_new_symbol().
-    # this won't create a new symbol, only update its value to a new Value object
-    # returns False if the set failed due to an unknown variable that wasn't found in any
-    # of the nested blocks of the current function
-    def set(self, symbol, value):
-        for env in reversed(self.environment):
-            if symbol in env:
-                env[symbol] = value
-                return True
-
-        return False
-
-    # used when we enter a nested block to create a new environment for that block
-    def block_nest(self):
-        self.environment.append({})  # [{}] -> [{}, {}]
-
-    # used when we exit a nested block to discard the environment for that block
-    def block_unnest(self):
-        self.environment.pop()
+from v3_type_value import null_value
+
+
+# A frame holds the parameters and let locals of one method call as a flat list of Values, replacing the stack of
+# per-block dicts that used to map names to VariableDefs. MethodCompiler (see v3_compiler.py) resolves every name
+# when the method is compiled: parameters take slots 0..n-1 in order, and each local gets the next free slot of the
+# block that declares it, so blocks that aren't nested in each other share slots. Compiled code reads and writes
+# frame[slot] directly, and knows the declared type of each slot; a slot that no block has set yet holds None.
+
+
+# creates the frame for a call of method_def with actual_params, a list of Values that becomes the frame itself:
+# the arguments are already in the parameters' slots, so binding them copies nothing, and the locals' slots are
+# appended from a tuple made once per method. No frame outlives its call (Brewin has no closures), so the frame is
+# garbage as soon as the method returns; CPython's list free list already recycles it, which is why frames aren't
+# pooled here.
+def create_frame(method_def, actual_params):
+    if method_def.local_slots:
+        actual_params += method_def.local_slots
+    return actual_params
+
+
+# A (return (call ...)) that isn't inside the try part of a try statement is a tail call: nothing of the calling
+# method runs after the callee returns except the return statement's type check. Instead of calling the method
+# itself, the return statement then returns a TailCall, and whatever is running the caller (ObjectDef.run_method(),
+# or run_code() in v3_bytecode.py) runs the callee in the caller's place, so a chain of tail calls of any length
+# takes a single activation. The return type checks that were skipped are kept in a list of pending returns, and run
+# on the value the last callee returns.
+class TailCall:
+    __slots__ = ("obj", "method_def", "args", "return_type", "line_num")
+
+    # obj is the object to run method_def on with args; return_type and line_num are those of the return statement
+    def __init__(self, obj, method_def, args, return_type, line_num):
+        self.obj = obj
+        self.method_def = method_def
+        self.args = args
+        self.return_type = return_type
+        self.line_num = line_num
+
+
+# adds the check of a tail call's return statement to pending, a list of (return_type, line_num), innermost last, or
+# None; checking a value against the same type twice in a row changes nothing, so a self-recursive method only needs
+# one entry however deep it recurses; returns the new list
+def add_pending_return(pending, return_type, line_num):
+    if pending is None:
+        return [(return_type, line_num)]
+    if pending[-1][0] is return_type:
+        pending[-1] = (return_type, line_num)  # the innermost check is the one that would fail
+    else:
+        pending.append((return_type, line_num))
+    return pending
+
+
+# runs the return statement type checks in pending on result, innermost first, as the return statements of the
+# callers would have; obj is used to report type errors
+def check_pending_returns(obj, result, pending):
+    for return_type, line_num in reversed(pending):
+        if result.is_typeless_null():
+            obj.check_type_compatibility(return_type, result.t, True, line_num)
+            result = null_value(return_type)  # propagate return type to null
+        obj.check_type_compatibility(return_type, result.t, True, line_num)
+    return result
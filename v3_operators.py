@@ -0,0 +1,168 @@
+"""
+Operator dispatch tables shared by every ObjectDef. They are built once, when this module is imported, instead of
+once per object (and superclass part), and are read-only so that no object or interpreter can change them for the
+others.
+
+BINARY_OPS[type_def][operator] and UNARY_OPS[type_def][operator] are functions taking Values and returning a Value;
+type_def is one of InterpreterBase.INT_DEF, STRING_DEF, BOOL_DEF or CLASS_DEF (for object references). Results are
+made with int_value() and friends, so bools, small ints and empty strings are shared Values.
+
+PRIMITIVE_BINARY_OPS[type][operator] is the same operator on the unboxed Python values of two operands of type (the
+int, string or bool Type), returning the result Value with no other calls; see BinaryOpSite for how the engines use
+them.
+"""
+
+import operator
+from types import MappingProxyType
+
+from intbase import InterpreterBase
+from v3_type_value import BOOL_TYPE, INT_TYPE, SMALL_INT_MAX, SMALL_INT_MIN, SMALL_INT_VALUES, STRING_TYPE
+from v3_type_value import FALSE_VALUE, TRUE_VALUE, Value, bool_value, int_value, string_value
+
+BINARY_OPERATORS = frozenset(
+    ["+", "-", "*", "/", "%", "==", "!=", "<", "<=", ">", ">=", "&", "|"]
+)
+UNARY_OPERATORS = frozenset(["!"])
+
+BINARY_OPS = MappingProxyType(
+    {
+        InterpreterBase.INT_DEF: MappingProxyType(
+            {
+                "+": lambda a, b: int_value(a.value() + b.value()),
+                "-": lambda a, b: int_value(a.value() - b.value()),
+                "*": lambda a, b: int_value(a.value() * b.value()),
+                "/": lambda a, b: int_value(a.value() // b.value()),  # // for integer ops
+                "%": lambda a, b: int_value(a.value() % b.value()),
+                "==": lambda a, b: bool_value(a.value() == b.value()),
+                "!=": lambda a, b: bool_value(a.value() != b.value()),
+                ">": lambda a, b: bool_value(a.value() > b.value()),
+                "<": lambda a, b: bool_value(a.value() < b.value()),
+                ">=": lambda a, b: bool_value(a.value() >= b.value()),
+                "<=": lambda a, b: bool_value(a.value() <= b.value()),
+            }
+        ),
+        InterpreterBase.STRING_DEF: MappingProxyType(
+            {
+                "+": lambda a, b: string_value(a.value() + b.value()),
+                "==": lambda a, b: bool_value(a.value() == b.value()),
+                "!=": lambda a, b: bool_value(a.value() != b.value()),
+                ">": lambda a, b: bool_value(a.value() > b.value()),
+                "<": lambda a, b: bool_value(a.value() < b.value()),
+                ">=": lambda a, b: bool_value(a.value() >= b.value()),
+                "<=": lambda a, b: bool_value(a.value() <= b.value()),
+            }
+        ),
+        InterpreterBase.BOOL_DEF: MappingProxyType(
+            {
+                "&": lambda a, b: bool_value(a.value() and b.value()),
+                "|": lambda a, b: bool_value(a.value() or b.value()),
+                "==": lambda a, b: bool_value(a.value() == b.value()),
+                "!=": lambda a, b: bool_value(a.value() != b.value()),
+            }
+        ),
+        InterpreterBase.CLASS_DEF: MappingProxyType(
+            {
+                "==": lambda a, b: bool_value(a.value() == b.value()),
+                "!=": lambda a, b: bool_value(a.value() != b.value()),
+            }
+        ),
+    }
+)
+
+UNARY_OPS = MappingProxyType(
+    {
+        InterpreterBase.BOOL_DEF: MappingProxyType(
+            {
+                "!": lambda a: bool_value(not a.value()),
+            }
+        ),
+    }
+)
+
+
+# each binary operator as a Python function on unboxed ints, strings or bools; which operators apply to which type
+# is given by PRIMITIVE_BINARY_OPS
+PYTHON_OPERATORS = MappingProxyType(
+    {
+        "+": operator.add,
+        "-": operator.sub,
+        "*": operator.mul,
+        "/": operator.floordiv,  # // for integer ops
+        "%": operator.mod,
+        "==": operator.eq,
+        "!=": operator.ne,
+        ">": operator.gt,
+        "<": operator.lt,
+        ">=": operator.ge,
+        "<=": operator.le,
+        "&": operator.and_,
+        "|": operator.or_,
+    }
+)
+
+# operators whose result is a bool whatever the type of their operands
+BOOL_RESULT_OPERATORS = frozenset(["==", "!=", ">", "<", ">=", "<=", "&", "|"])
+
+
+# returns the PRIMITIVE_BINARY_OPS function for the int arithmetic operator op, which makes its result Value like
+# int_value() does without calling it
+def _int_operator(op):
+    function = PYTHON_OPERATORS[op]
+
+    def apply(x, y):
+        n = function(x, y)
+        if SMALL_INT_MIN <= n <= SMALL_INT_MAX:
+            return SMALL_INT_VALUES[n - SMALL_INT_MIN]
+        return Value(INT_TYPE, n)
+
+    return apply
+
+
+# comparisons, which mean the same for ints, strings and bools
+_COMPARISONS = {
+    "==": lambda x, y: TRUE_VALUE if x == y else FALSE_VALUE,
+    "!=": lambda x, y: TRUE_VALUE if x != y else FALSE_VALUE,
+    ">": lambda x, y: TRUE_VALUE if x > y else FALSE_VALUE,
+    "<": lambda x, y: TRUE_VALUE if x < y else FALSE_VALUE,
+    ">=": lambda x, y: TRUE_VALUE if x >= y else FALSE_VALUE,
+    "<=": lambda x, y: TRUE_VALUE if x <= y else FALSE_VALUE,
+}
+
+PRIMITIVE_BINARY_OPS = MappingProxyType(
+    {
+        INT_TYPE: MappingProxyType(
+            {**{op: _int_operator(op) for op in ["+", "-", "*", "/", "%"]}, **_COMPARISONS}
+        ),
+        STRING_TYPE: MappingProxyType(
+            {"+": lambda x, y: string_value(x + y), **_COMPARISONS}
+        ),
+        BOOL_TYPE: MappingProxyType(
+            {
+                "&": lambda x, y: TRUE_VALUE if x and y else FALSE_VALUE,
+                "|": lambda x, y: TRUE_VALUE if x or y else FALSE_VALUE,
+                "==": _COMPARISONS["=="],
+                "!=": _COMPARISONS["!="],
+            }
+        ),
+    }
+)
+
+
+# The state of one binary operator expression, shared by the engines running it. The first time its operands are
+# both of one primitive type the operator applies to, the site is specialized to that type: from then on, operands
+# of that type pass the guard (both Types are the site's type) and are handed to the PRIMITIVE_BINARY_OPS function
+# directly, skipping the type dispatch and table lookups of the generic path, which everything else still takes.
+class BinaryOpSite:
+    __slots__ = ("operator", "fast_type", "fast_op")
+
+    def __init__(self, operator):
+        self.operator = operator
+        self.fast_type = None  # the primitive Type the site is specialized to, or None
+        self.fast_op = None  # PRIMITIVE_BINARY_OPS[fast_type][operator]
+
+    # called by the generic path with the Type of two operands it found the operator applies to; specializes the
+    # site if it isn't yet
+    def observe(self, operand_type):
+        if self.fast_type is None:
+            self.fast_op = PRIMITIVE_BINARY_OPS[operand_type][self.operator]
+            self.fast_type = operand_type
@@ -0,0 +1,59 @@
+"""
+The thread the ast and closure engines run programs on. They run each Brewin call on Python's own stack, so a deep
+recursion needs a raised Python recursion limit and a C stack big enough for it (see Interpreter.PYTHON_STACK_SIZE),
+more than the main thread of a process has.
+
+A DeepStackWorker starts its thread the first time it's called and runs everything it's given after that on the same
+thread, one call at a time, so a host that runs many programs creates the thread and maps its stack once. The thread
+is a daemon: a process that's exiting doesn't wait for it, e.g. after a KeyboardInterrupt stops the thread that was
+waiting for a program to finish (the program itself isn't interrupted until then).
+"""
+
+import queue
+import threading
+
+
+class DeepStackWorker:
+    def __init__(self, stack_size, name):
+        self.stack_size = stack_size
+        self.name = name
+        self.thread = None  # started by the first call()
+        self.start_lock = threading.Lock()
+        self.calls = queue.SimpleQueue()  # (function, outcome, done) for each call() waiting for the thread
+
+    # runs function() on the worker's thread, and returns what it returns or raises what it raises. Calls made from
+    # several threads at once run one after the other; a call made on the worker's thread runs right away
+    def call(self, function):
+        if threading.current_thread() is self.thread:
+            return function()
+        self.__start()
+        outcome = []  # [result] or [None, error]
+        done = threading.Event()
+        self.calls.put((function, outcome, done))
+        done.wait()
+        if len(outcome) > 1:
+            error = outcome.pop()
+            raise error
+        return outcome[0]
+
+    def __start(self):
+        with self.start_lock:
+            if self.thread is not None:
+                return
+            thread = threading.Thread(target=self.__run, name=self.name, daemon=True)
+            # the stack size is read when a thread starts, so only this one gets it
+            previous_stack_size = threading.stack_size(self.stack_size)
+            try:
+                thread.start()
+            finally:
+                threading.stack_size(previous_stack_size)
+            self.thread = thread
+
+    def __run(self):
+        while True:
+            function, outcome, done = self.calls.get()
+            try:
+                outcome.append(function())
+            except BaseException as error:  # pylint: disable=broad-except
+                outcome[:] = [None, error]
+            done.set()
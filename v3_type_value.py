@@ -1,21 +1,34 @@
+import weakref
+
 from intbase import InterpreterBase
 
 
-# Enumerated type for our different language data types
+# Enumerated type for our different language data types. Types are interned: Type(type_name) always returns the
+# same object for the same name (see TypeManager.intern_type), so types compare and hash by identity and can be
+# used as dict keys. Supertypes are tracked by the TypeManager of each program. Each Type holds its own null Value
+# (see null_value()).
 class Type:
-    def __init__(self, type_name, supertype_name=None):
-        self.type_name = type_name
-        self.supertype_name = supertype_name
+    __slots__ = ("type_name", "null", "__weakref__")
 
-    def __eq__(self, other):
-        return (
-            self.type_name == other.type_name
-            and self.supertype_name == other.supertype_name
-        )
+    def __new__(cls, type_name):
+        return TypeManager.intern_type(type_name)
+
+    # copies and pickles of a Type are the interned Type
+    def __reduce__(self):
+        return (Type, (self.type_name,))
+
+    def __repr__(self):
+        return f"Type({self.type_name!r})"
 
 
 # Represents a value, which has a type and its value
+# Values are never changed once they're made (assigning to a variable stores a different Value), so the same Value
+# can be held by any number of variables, fields and frames; the common ones are shared singletons (see below).
+# Nothing enforces this (a __setattr__ that did would slow down making every Value), so never assign to t or v.
+# Equal Values hash alike, so they can be dict keys
 class Value:
+    __slots__ = ("t", "v")
+
     def __init__(self, type_obj, value=None):
         self.t = type_obj
         self.v = value
@@ -23,64 +36,101 @@ class Value:
     def value(self):
         return self.v
 
-    def set(self, other):
-        self.t = other.t
-        self.v = other.v
-
     def type(self):
         return self.t
 
     def is_null(self):
-        return self.v == None and self.t != Type(InterpreterBase.NOTHING_DEF)
-  
+        return self.v is None and self.t is not NOTHING_TYPE
+
     def is_typeless_null(self):
-        return self.v == None and self.t == Type(InterpreterBase.NULL_DEF)
+        return self.v is None and self.t is NULL_TYPE
     
     def __eq__(self, other):
         return self.t == other.t and self.v == other.v
 
+    def __hash__(self):
+        return hash((self.t, self.v))
+
+
+# returns the Value of int n; small ints are shared, like CPython's own
+def int_value(n):
+    if SMALL_INT_MIN <= n <= SMALL_INT_MAX:
+        return SMALL_INT_VALUES[n - SMALL_INT_MIN]
+    return Value(INT_TYPE, n)
+
+
+# returns the Value of bool b, one of two singletons
+def bool_value(b):
+    return TRUE_VALUE if b else FALSE_VALUE
+
+
+# returns the Value of string s
+def string_value(s):
+    if not s:
+        return EMPTY_STRING_VALUE
+    return Value(STRING_TYPE, s)
+
+
+# returns null of the type type_def (a Type object); there's one per type
+def null_value(type_def):
+    return type_def.null
+
 
 # val is a string with the value we want to use to construct a Value object.
 # e.g., '1234' 'null' 'true' '"foobar"'
 def create_value(val):
     if val == InterpreterBase.TRUE_DEF:
-        return Value(Type(InterpreterBase.BOOL_DEF), True)
+        return TRUE_VALUE
     elif val == InterpreterBase.FALSE_DEF:
-        return Value(Type(InterpreterBase.BOOL_DEF), False)
+        return FALSE_VALUE
     elif val[0] == '"':
-        return Value(Type(InterpreterBase.STRING_DEF), val.strip('"'))
+        return string_value(val.strip('"'))
     elif val.lstrip('-').isnumeric():
-        return Value(Type(InterpreterBase.INT_DEF), int(val))
+        return int_value(int(val))
     elif val == InterpreterBase.NULL_DEF:
-        return Value(Type(InterpreterBase.NULL_DEF), None)
+        return null_value(NULL_TYPE)
     else:
         return None
 
 
 # create a default value of the specified type; type_def is a Type object
+# the nothing type (used for void return type on methods) and class types get None, i.e. null with the proper class
+# type, for their default value
 def create_default_value(type_def):
-    if type_def == Type(InterpreterBase.BOOL_DEF):
-        return Value(Type(InterpreterBase.BOOL_DEF), False)
-    elif type_def == Type(InterpreterBase.STRING_DEF):
-        return Value(Type(InterpreterBase.STRING_DEF), "")
-    elif type_def == Type(InterpreterBase.INT_DEF):
-        return Value(Type(InterpreterBase.INT_DEF), 0)
-    elif type_def == Type(
-        InterpreterBase.NOTHING_DEF
-    ):  # used for void return type on methods
-        return Value(Type(InterpreterBase.NOTHING_DEF), None)
-    else:
-        return Value(
-            type_def, None
-        )  # the type is a class type, so we return null for default val, with proper class type
+    value = PRIMITIVE_DEFAULT_VALUES.get(type_def)
+    if value is None:
+        return null_value(type_def)
+    return value
 
 
 # Used to track user-defined types (for classes) as well as check for type compatibility between
 # values of same/different types for assignment/comparison
 class TypeManager:
+    # canonical Type object for each type name; shared by every TypeManager, since a Type is nothing but its name.
+    # The table only holds the Types something else still refers to, so the types of programs that are gone (e.g.
+    # the specializations of their templates) don't pile up in a process that runs many programs
+    interned_types = weakref.WeakValueDictionary()
+
+    @staticmethod
+    def intern_type(type_name):
+        type_obj = TypeManager.interned_types.get(type_name)
+        if type_obj is None:
+            type_obj = object.__new__(Type)
+            type_obj.type_name = str(type_name)
+            type_obj.null = Value(type_obj, None)
+            TypeManager.interned_types[type_obj.type_name] = type_obj
+        return type_obj
+
     def __init__(self):
         self.map_typename_to_type = {}
+        self.map_typename_to_supertype_name = {}
         self.__setup_primitive_types()
+        # incremented whenever a class type is added, e.g. when a template is instantiated at runtime; anything
+        # cached from type checks (see CallSiteCache in v3_callsite.py) is stale once this changes
+        self.version = 0
+        # memos for the type checks below; cleared along with the version bump
+        self.map_typename_to_ancestors = {}
+        self.map_types_to_compatibility = {}
 
         self.map_template_class_name_to_class_def = {}
 
@@ -89,8 +139,19 @@ class TypeManager:
     # needs to be called the moment we parse the class name and superclass name to enable things like linked lists
     # and other self-referential structures
     def add_class_type(self, class_name, superclass_name):
-        class_type = Type(class_name, superclass_name)
-        self.map_typename_to_type[class_name] = class_type
+        self.map_typename_to_type[class_name] = Type(class_name)
+        self.map_typename_to_supertype_name[class_name] = superclass_name
+        self.version += 1
+        self.map_typename_to_ancestors.clear()
+        self.map_types_to_compatibility.clear()
+
+    # takes back add_class_type(), for a class built from a template that turned out not to be valid
+    def remove_class_type(self, class_name):
+        del self.map_typename_to_type[class_name]
+        del self.map_typename_to_supertype_name[class_name]
+        self.version += 1
+        self.map_typename_to_ancestors.clear()
+        self.map_types_to_compatibility.clear()
 
     # Adds this in as a list of strings
     def add_template_class_type(self, template_class_name, template_class_def):
@@ -111,18 +172,25 @@ class TypeManager:
             suspected_subtype
         ):
             return False
-        cur_type = suspected_subtype
-        while True:
-            if (
-                suspected_supertype == cur_type
-            ):  # passing a Student object to a Student parameter
-                return True
-            type_info = self.get_type_info(cur_type)
-            if type_info.supertype_name is None:
-                return False
-            cur_type = (
-                type_info.supertype_name #check suspected supertype is in the inheritance chain
-            )  # check the base class of the subtype next
+        # passing a Student object to a Student parameter, or to a Person parameter if Person is a base class
+        return suspected_supertype in self.__get_ancestors(suspected_subtype)
+
+    # returns the set of names of a valid type and all of its supertypes; this is the transitive closure of the
+    # supertype relation, computed at most once per type between changes to the set of types
+    def __get_ancestors(self, typename):
+        ancestors = self.map_typename_to_ancestors.get(typename)
+        if ancestors is not None:
+            return ancestors
+        ancestors = {typename}
+        supertype_name = self.map_typename_to_supertype_name.get(typename)
+        # check the base class of the subtype next
+        if supertype_name is not None and self.is_valid_type(supertype_name):
+            ancestors |= self.__get_ancestors(supertype_name)
+        elif supertype_name is not None:
+            ancestors.add(supertype_name)
+        ancestors = frozenset(ancestors)
+        self.map_typename_to_ancestors[typename] = ancestors
+        return ancestors
 
     def split_template_class_initializer(self, template_class_initializer):
         split_string = template_class_initializer.split(InterpreterBase.TYPE_CONCAT_CHAR)
@@ -151,18 +219,16 @@ class TypeManager:
 
         return True
 
-    # TO-DO: Update the naming convention on this
-    # Recursive function to do our find and replace 
-    def replace_parameter_strings(self, class_source, template_type, user_provided_type):
-        if isinstance(class_source, list):
-            return [self.replace_parameter_strings(item, template_type, user_provided_type) for item in class_source]
-        elif isinstance(class_source, str) and (class_source == template_type or template_type in class_source):
-            return class_source.replace(template_type, user_provided_type)
-        else:
-            return class_source
-
-    # typea and typeb are Type objects
+    # typea and typeb are Type objects; results are memoized
     def check_type_compatibility(self, typea, typeb, for_assignment):
+        key = (typea, typeb, for_assignment)
+        compatible = self.map_types_to_compatibility.get(key)
+        if compatible is None:
+            compatible = self.__check_type_compatibility(typea, typeb, for_assignment)
+            self.map_types_to_compatibility[key] = compatible
+        return compatible
+
+    def __check_type_compatibility(self, typea, typeb, for_assignment):
         # if either type is invalid (E.g., the user referenced a class name that doesn't exist) then
         # return false
         if not self.is_valid_type(typea.type_name) or not self.is_valid_type(
@@ -218,3 +284,24 @@ class TypeManager:
         self.map_typename_to_type[InterpreterBase.NULL_DEF] = Type(
             InterpreterBase.NULL_DEF
         )
+
+
+NOTHING_TYPE = Type(InterpreterBase.NOTHING_DEF)
+NULL_TYPE = Type(InterpreterBase.NULL_DEF)
+INT_TYPE = Type(InterpreterBase.INT_DEF)
+STRING_TYPE = Type(InterpreterBase.STRING_DEF)
+BOOL_TYPE = Type(InterpreterBase.BOOL_DEF)
+
+# shared Values (see int_value(), bool_value(), string_value() and null_value())
+TRUE_VALUE = Value(BOOL_TYPE, True)
+FALSE_VALUE = Value(BOOL_TYPE, False)
+EMPTY_STRING_VALUE = Value(STRING_TYPE, "")
+SMALL_INT_MIN = -5
+SMALL_INT_MAX = 256
+SMALL_INT_VALUES = tuple(Value(INT_TYPE, n) for n in range(SMALL_INT_MIN, SMALL_INT_MAX + 1))
+
+PRIMITIVE_DEFAULT_VALUES = {
+    BOOL_TYPE: FALSE_VALUE,
+    STRING_TYPE: EMPTY_STRING_VALUE,
+    INT_TYPE: int_value(0),
+}